@@ -8,17 +8,38 @@
 # without an express license agreement from NVIDIA CORPORATION or
 # its affiliates is strictly prohibited.
 
-import base64
+import os
+from collections import OrderedDict
 from typing import List, Tuple
 
+import carb
 import omni.ui as ui
+from pybase64 import b64encode
+
+# Number of encoded image files kept in memory
+IMAGE_CACHE_SIZE = 8
+
+
+def _identity(value):
+    return value
 
 
 class AbstractUpliftModel:
     def __init__(self):
-        # Hold the base64 of the different buffers of the viewport
+        # Hold the PNG bytes of the different buffers of the viewport
         self._viewport_buffers = {}
 
+        # base64 of the image parameters, keyed by (path, mtime, size) so an edited file is encoded again
+        self._image_b64_cache = OrderedDict()
+
+        # Convert a parameter value to what is stored, per value type
+        self._parameter_handlers = {
+            "float": _identity,
+            "int": _identity,
+            "string": _identity,
+            "image": self._encode_image,
+        }
+
         # Hold the parameters of the model and their values
         self._parameters = {}
         self._init_parameters()
@@ -43,23 +64,32 @@ class AbstractUpliftModel:
         for param in params_spec:
             self._parameters[param["name"]] = param["default_value"]
 
-    def set_parameters(self, name: str, value_type: str, value):
-        """Set the value of a parameter"""
-        if value_type == "float":
-            self._parameters[name] = value
-        elif value_type == "int":
-            self._parameters[name] = value
-        elif value_type == "string":
-            self._parameters[name] = value
-        elif value_type == "image":
-            path = value
+    def _encode_image(self, path: str) -> str:
+        """Return the base64 of the image file"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        base64_image = self._image_b64_cache.get(key)
+        if base64_image is None:
             with open(path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode("utf-8")
-            self._parameters[name] = base64_image
+                base64_image = b64encode(image_file.read()).decode("ascii")
+            self._image_b64_cache[key] = base64_image
+            if len(self._image_b64_cache) > IMAGE_CACHE_SIZE:
+                self._image_b64_cache.popitem(last=False)
         else:
+            self._image_b64_cache.move_to_end(key)
+        return base64_image
+
+    def set_parameters(self, name: str, value_type: str, value):
+        """Set the value of a parameter"""
+        handler = self._parameter_handlers.get(value_type)
+        if handler is None:
             raise ValueError("Invalid value type")
+        self._parameters[name] = handler(value)
 
-        print(f"set_parameters {name} {self._parameters[name]}")
+        # Images are megabytes of base64, only log their length
+        val = self._parameters[name]
+        preview = val if not isinstance(val, str) or len(val) < 64 else f"<{len(val)} chars>"
+        carb.log_info(f"set_parameters {name}={preview}")
 
     def get_parameters_spec(self) -> dict:
         """Return the list of parameters names, tupe and default values"""
@@ -69,12 +99,12 @@ class AbstractUpliftModel:
         """Update the viewport buffers"""
         self._viewport_buffers = viewport_buffers.copy()
 
-    def generate(self, progress_model: ui.SimpleFloatModel = None, **kwargs) -> Tuple[list, list]:
+    def generate(self, progress_model: ui.SimpleFloatModel = None, **kwargs) -> Tuple[bytes, list]:
         """
-        Generate the uplifted image and return it as base64
+        Generate the uplifted image
         by default will use the internal parameters and their default
         but they can be overridden by the kwargs
 
-        return the list of bytes as unit8 and [width, height]
+        return the RGBA pixels as uint8 bytes and [width, height], or (None, None) when the generation failed
         """
         pass
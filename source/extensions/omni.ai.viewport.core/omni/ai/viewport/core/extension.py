@@ -37,6 +37,7 @@ class AIViewportCoreExtension(omni.ext.IExt):
         if self._viewport_buffers_capture:
             self._viewport_buffers_capture = None
         if self._uplift_model:
+            self._uplift_model.destroy()
             self._uplift_model = None
 
     @staticmethod
@@ -9,22 +9,31 @@
 # its affiliates is strictly prohibited.
 
 import asyncio
-import base64
-import json
+import copy
+import functools
+import importlib.util
+import itertools
 import os
-import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from typing import List, Tuple
-from urllib import parse, request
 
-import numpy as np
+import ahocorasick
 import aiohttp
 import carb
 import carb.settings
+import orjson
 import websockets
 from PIL import Image
-from better_profanity import profanity
+
+try:
+    from turbojpeg import TJPF_RGBA, TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError):
+    # PyTurboJPEG is not installed or libjpeg-turbo could not be found
+    _turbo_jpeg = None
 
 from ...abstract_uplift_model import AbstractUpliftModel
 
@@ -32,9 +41,29 @@ SERVER_ADDRESS = "/exts/omni.ai.viewport.core/comfy/server_address"
 
 WORKFLOW_FOLDER = "/exts/omni.ai.viewport.core/comfy/workflows_folder"
 DEFAULT_WORKFLOW = "/exts/omni.ai.viewport.core/comfy/default_workflow"
+MAX_IN_FLIGHT = "/exts/omni.ai.viewport.core/comfy/max_in_flight"
 
 WEBSOCKET_MAX_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Word list of better_profanity, used when the extension's list is empty like better_profanity did
+DEFAULT_PROFANITY_WORDLIST = os.path.join(
+    importlib.util.find_spec("better_profanity").submodule_search_locations[0], "profanity_wordlist.txt"
+)
+# Characters each letter of a censored word can be written with, the variant table of better_profanity
+PROFANITY_CHAR_VARIANTS = {
+    "a": ("a", "@", "*", "4"),
+    "i": ("i", "*", "l", "1"),
+    "o": ("o", "*", "0", "@"),
+    "u": ("u", "*", "v"),
+    "v": ("v", "*", "u"),
+    "l": ("l", "1"),
+    "e": ("e", "*", "3"),
+    "s": ("s", "$", "5"),
+    "t": ("t", "7"),
+}
+# Characters that are part of a word besides the letters and digits, the others separate the words
+PROFANITY_WORD_CHARACTERS = frozenset("@$*")
+
 from pathlib import Path
 
 EXT_ROOT = Path(__file__).parent.parent.parent.parent.parent.parent.parent
@@ -42,6 +71,69 @@ EXT_ROOT = Path(__file__).parent.parent.parent.parent.parent.parent.parent
 import omni.ui as ui
 
 
+def _read_wordlist(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [word for word in (line.strip().lower() for line in f) if word]
+
+
+def _load_profanity_matcher(path: str):
+    """
+    Build an Aho-Corasick automaton of every variant of the censored words of the file, or of the better_profanity
+    list when the file is empty. Return None if there are no words.
+    """
+    words = _read_wordlist(path) or _read_wordlist(DEFAULT_PROFANITY_WORDLIST)
+    if not words:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        for chars in itertools.product(*(PROFANITY_CHAR_VARIANTS.get(char, (char,)) for char in word)):
+            automaton.add_word("".join(chars), len(word))
+    automaton.make_automaton()
+    return automaton
+
+
+def _is_word_character(char: str) -> bool:
+    return char.isalnum() or char in PROFANITY_WORD_CHARACTERS
+
+
+def _contains_profanity(matcher, text: str) -> bool:
+    """Whether the text has a censored word, matched as a whole word"""
+    text = text.lower()
+    for end, length in matcher.iter(text):
+        start = end - length + 1
+        # Only whole words count, so "class" doesn't match "ass"
+        if (start == 0 or not _is_word_character(text[start - 1])) and (
+            end + 1 == len(text) or not _is_word_character(text[end + 1])
+        ):
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=4)
+def _list_workflows(folder: str, mtime_ns: int) -> Tuple[str, ...]:
+    """Names of the workflows in the folder, cached until the folder mtime changes"""
+    with os.scandir(folder) as entries:
+        return tuple(entry.name[: -len(".json")] for entry in entries if entry.name.endswith(".json"))
+
+
+def _read_workflow_files(path: str) -> tuple:
+    """Return the parsed workflow and spec (None if there is no spec file) of the workflow path without extension"""
+    comfy_path = f"{path}.json"
+    if not os.path.isfile(comfy_path):
+        raise ValueError(f"Failure to open ComfyUI Workflow API Format file: {comfy_path}")
+    with open(comfy_path, "rb") as f:
+        comfy_json = orjson.loads(f.read())
+
+    comfy_spec = None
+    spec_path = f"{path}.spec"
+    if os.path.isfile(spec_path):
+        with open(spec_path, "rb") as f:
+            comfy_spec = orjson.loads(f.read())
+
+    return comfy_json, comfy_spec
+
+
 class ComfyUplift(AbstractUpliftModel):
     def __init__(self):
         self.settings = carb.settings.get_settings()
@@ -57,43 +149,73 @@ class ComfyUplift(AbstractUpliftModel):
         self._workflow_folder = self.settings.get(WORKFLOW_FOLDER)
         self._default_workflow = self.settings.get(DEFAULT_WORKFLOW)
 
+        # Parsed workflow and spec with their controls identified, per workflow name
+        self._workflow_cache = {}
+        # Workflow files read ahead of time, consumed by load_workflow
+        self._preparsed_workflows = self._preparse_workflows()
         self.load_workflow(self._default_workflow)
 
-        profanity.load_censor_words_from_file(f"{EXT_ROOT}/data/profanity_wordlist.txt")
+        self._profanity_matcher = _load_profanity_matcher(f"{EXT_ROOT}/data/profanity_wordlist.txt")
+        self._last_safe_prompts = None
 
         self._websocket_client_id = str(uuid.uuid4())
-        self.busy = False
+        self._http = None
+        self._ws = None
+        self._ws_lock = asyncio.Lock()
+        self._ws_reader = None
+        # Completion future per prompt id queued by generate, resolved by the websocket reader
+        self._pending = {}
+        # prompt id -> websocket its completion is expected on, a closed socket only fails its own prompts
+        self._pending_ws = {}
+
+        # Number of prompts that can be queued on ComfyUI at once. Each slot has its own uploaded buffer files so
+        # a queued prompt doesn't read the buffers of the next one.
+        self._free_slots = asyncio.Queue()
+        for slot in range(self.settings.get(MAX_IN_FLIGHT) or 2):
+            self._free_slots.put_nowait(slot)
 
         super().__init__()
 
     def get_available_mode(self) -> List[str]:
         full_workflow_path = f"{EXT_ROOT}/{self._workflow_folder}"
-        workflows = []
-        list_files = os.listdir(full_workflow_path)
-        for file in list_files:
-            if ".json" in file:
-                base_name = file.replace(".json", "")
-                workflows.append(base_name)
-        return workflows
+        return list(_list_workflows(full_workflow_path, os.stat(full_workflow_path).st_mtime_ns))
+
+    def _preparse_workflows(self) -> dict:
+        """Read and parse all the workflow files of the folder in parallel"""
+        full_workflow_path = f"{EXT_ROOT}/{self._workflow_folder}"
+
+        def read(name):
+            try:
+                return _read_workflow_files(f"{full_workflow_path}/{name}")
+            except Exception:
+                # load_workflow reads it again and reports the error if this workflow is used
+                return None
+
+        names = self.get_available_mode()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return dict(zip(names, executor.map(read, names)))
 
     def set_mode(self, mode: str):
         self.load_workflow(mode)
 
     def load_workflow(self, name: str):
-        full_workflow_path = f"{EXT_ROOT}/{self._workflow_folder}/{name}"
-        # Read the workflow file (TODO check existance)
-        comfy_path = f"{full_workflow_path}.json"
-        if os.path.isfile(comfy_path):
-            with open(comfy_path, "r") as f:
-                self._comfy_json = json.load(f)
-        else:
-            raise ValueError(f"Failure to open ComfyUI Workflow API Format file: {comfy_path}")
+        if name in self._workflow_cache:
+            (
+                self._comfy_json,
+                self._comfy_parameters,
+                self._param_by_name,
+                self._prompt_template,
+            ) = self._workflow_cache[name]
+            self.reset_parameters()
+            return
 
-        spec_path = f"{full_workflow_path}.spec"
-        if os.path.isfile(spec_path):
-            # Read the spec file
-            with open(spec_path, "r") as f:
-                self._comfy_parameters = json.load(f)
+        workflow_files = self._preparsed_workflows.pop(name, None)
+        if workflow_files is None:
+            workflow_files = _read_workflow_files(f"{EXT_ROOT}/{self._workflow_folder}/{name}")
+        self._comfy_json, comfy_spec = workflow_files
+
+        if comfy_spec is not None:
+            self._comfy_parameters = comfy_spec
         else:
             # We are in auto mode the spec are in the workflow
             # This need to error clearly if the spec are not defined
@@ -101,6 +223,12 @@ class ComfyUplift(AbstractUpliftModel):
 
         # We identify all the controls
         self._identifyControls()
+        self._workflow_cache[name] = (
+            self._comfy_json,
+            self._comfy_parameters,
+            self._param_by_name,
+            self._prompt_template,
+        )
         self.reset_parameters()
 
     def _get_params_from_workflow(self):
@@ -159,75 +287,166 @@ class ComfyUplift(AbstractUpliftModel):
             if "control_id" not in param:
                 carb.log_warn("Control not found for %s" % param["control_name"])
 
+        self._param_by_name = {param["name"]: param for param in self._comfy_parameters}
+
+        # Scratch copy of the workflow the prompts are written into, so the parsed workflow is never modified
+        self._prompt_template = copy.deepcopy(self._comfy_json)
+
     def get_parameters_spec(self) -> dict:
         return self._comfy_parameters
 
-    def _generate_prompt(self, generation_params: dict) -> dict:
-        """Generate the prompt for the comfy"""
+    def _generate_prompt(self, generation_params: dict, uploaded_buffers: dict) -> dict:
+        """
+        Generate the prompt for the comfy
+
+        The controls are written in place in the prompt template, the result must be serialized before the next call
+        """
 
-        updated_prompt = self._comfy_json.copy()
+        updated_prompt = self._prompt_template
         for key, value in generation_params.items():
-            for param in self._comfy_parameters:
-                if key == param["name"]:
-                    if "control_id" not in param:
-                        continue
-                    control_id = param["control_id"]
-                    input_name = param["input_name"]
+            param = self._param_by_name.get(key)
+            if param is None or "control_id" not in param:
+                continue
+            control_id = param["control_id"]
+            input_name = param["input_name"]
 
-                    if param["type"] == "image":
-                        control_name = param["control_name"]
-                        updated_prompt[control_id]["inputs"][input_name] = self._viewport_buffers[control_name]
-                    else:
-                        updated_prompt[control_id]["inputs"][input_name] = value
-                    break
+            if param["type"] == "image":
+                control_name = param["control_name"]
+                # The buffer is uploaded as a file, so read it with the stock loader instead of base64
+                updated_prompt[control_id]["class_type"] = "LoadImage"
+                updated_prompt[control_id]["inputs"][input_name] = uploaded_buffers[control_name]
+            else:
+                updated_prompt[control_id]["inputs"][input_name] = value
 
         return updated_prompt
 
-    def _get_history(self, prompt_id, server_address):
-        with request.urlopen("http://{}/history/{}".format(server_address, prompt_id)) as response:
-            return json.loads(response.read())
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the HTTP session used to talk to ComfyUI, creating it on first use"""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60))
+        return self._http
+
+    async def _ensure_ws(self):
+        """Return the ComfyUI websocket, reconnecting it if it was closed"""
+        async with self._ws_lock:
+            if self._ws is None or self._ws.state.name != "OPEN":
+                ws_url = "ws://{}/ws?clientId={}".format(self._comfy_url, self._websocket_client_id)
+                self._ws = await websockets.connect(ws_url, max_size=WEBSOCKET_MAX_SIZE)
+                self._ws_reader = asyncio.ensure_future(self._read_ws(self._ws))
+            return self._ws
+
+    def _register_pending(self, prompt_id, ws):
+        """Create the completion future of a prompt, before it is queued so its events can't be missed"""
+        self._pending[prompt_id] = asyncio.get_event_loop().create_future()
+        self._pending_ws[prompt_id] = ws
+
+    def _pop_pending(self, prompt_id):
+        self._pending.pop(prompt_id, None)
+        self._pending_ws.pop(prompt_id, None)
+
+    def _on_ws_message(self, message: str):
+        message = orjson.loads(message)
+        data = message.get("data", {})
+
+        # Only the prompts registered by generate are resolved, the others (queued by another client or given up
+        # on after a timeout) are ignored so nothing is kept for them
+        future = self._pending.get(data.get("prompt_id"))
+        if future is None or future.done():
+            return
+
+        if message["type"] == "executing" and data["node"] is None:
+            future.set_result(None)
+        elif message["type"] == "execution_error":
+            future.set_exception(RuntimeError(f"ComfyUI execution error: {data.get('exception_message')}"))
 
-    def _get_image(self, filename, subfolder, folder_type, server_address):
+    async def _read_ws(self, ws):
+        """Resolve the pending prompts from the ComfyUI websocket events"""
+        try:
+            async for message in ws:
+                if not isinstance(message, str):
+                    # Binary frames are latent previews
+                    continue
+
+                # A malformed event is skipped, it mustn't stop the reader of the other prompts
+                try:
+                    self._on_ws_message(message)
+                except Exception as e:
+                    carb.log_error(f"Invalid ComfyUI websocket event: {e}")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            carb.log_error(f"ComfyUI websocket reader failed: {e}")
+        finally:
+            # Drop the dead socket so the next generation reconnects
+            if self._ws is ws:
+                self._ws = None
+            # Only the prompts listened on this socket, the others wait on a socket that reconnected since
+            for prompt_id, future in self._pending.items():
+                if self._pending_ws.get(prompt_id) is ws and not future.done():
+                    future.set_exception(ConnectionError("ComfyUI websocket closed"))
+
+    async def _close_connections(self):
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    async def _upload_image(self, filename: str, data: bytes) -> str:
+        """Upload a PNG to the ComfyUI input folder and return the name to reference it with"""
+        form = aiohttp.FormData()
+        form.add_field("image", data, filename=filename, content_type="image/png")
+        form.add_field("overwrite", "true")
+        async with self._get_session().post("http://{}/upload/image".format(self._comfy_url), data=form) as response:
+            return (await response.json())["name"]
+
+    async def _upload_viewport_buffers(self, viewport_buffers: dict, slot: int) -> dict:
+        """Upload all the viewport buffers, return the uploaded file name per control name"""
+        control_names = list(viewport_buffers.keys())
+        uploads = []
+        for control_name in control_names:
+            # Stable name per buffer so the ComfyUI input folder doesn't grow with each generation
+            filename = f"cava_{self._websocket_client_id}_{slot}_{control_name}.png"
+            uploads.append(self._upload_image(filename, viewport_buffers[control_name]))
+        return dict(zip(control_names, await asyncio.gather(*uploads)))
+
+    async def _get_history(self, prompt_id, server_address):
+        async with self._get_session().get("http://{}/history/{}".format(server_address, prompt_id)) as response:
+            return orjson.loads(await response.read())
+
+    async def _get_image(self, filename, subfolder, folder_type, server_address):
         data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-        url_values = parse.urlencode(data)
-        with request.urlopen("http://{}/view?{}".format(server_address, url_values)) as response:
-            return response.read()
+        async with self._get_session().get("http://{}/view".format(server_address), params=data) as response:
+            return await response.read()
 
-    def _get_images(self, prompt_id, server_address, allow_preview=False, interval=1, timeout=600):
-        output_images = []
+    async def _get_images(self, prompt_id, server_address, allow_preview=False, timeout=600):
+        try:
+            await asyncio.wait_for(self._pending[prompt_id], timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"TIMEOUT ({timeout}): prompt {prompt_id} did not complete")
+        finally:
+            self._pop_pending(prompt_id)
+
+        history = (await self._get_history(prompt_id, server_address))[prompt_id]
+        node_fetches = []
+        for node_id in history["outputs"]:
+            node_output = history["outputs"][node_id]
+            if "images" in node_output:
+                fetches = []
+                for image in node_output["images"]:
+                    if "filename" not in image or "subfolder" not in image or "type" not in image:
+                        continue
 
-        num_try = timeout // interval
-        for try_id in range(num_try):
-            try:
-                history = self._get_history(prompt_id, server_address)[prompt_id]
-                for node_id in history["outputs"]:
-                    node_output = history["outputs"][node_id]
-                    # output_data = {}
-                    if "images" in node_output:
-                        output_data = None
-                        for image in node_output["images"]:
-                            if "filename" not in image or "subfolder" not in image or "type" not in image:
-                                continue
-
-                            if allow_preview and image["type"] == "temp":
-                                preview_data = self._get_image(
-                                    image["filename"], image["subfolder"], image["type"], server_address
-                                )
-                                output_data = preview_data
-                            if image["type"] == "output":
-                                image_data = self._get_image(
-                                    image["filename"], image["subfolder"], image["type"], server_address
-                                )
-                                output_data = image_data
-                        if output_data is not None:
-                            output_images.append(output_data)
-            except Exception as e:
-                if try_id == num_try - 1:
-                    raise TimeoutError(f"TIMEOUT ({timeout}): {str(e)}")
-                # logging.warning("waiting for result ...")
-                time.sleep(interval)
-                continue
-            break
+                    if image["type"] == "output" or (allow_preview and image["type"] == "temp"):
+                        fetches.append(
+                            self._get_image(image["filename"], image["subfolder"], image["type"], server_address)
+                        )
+                node_fetches.append(fetches)
+
+        # Download the images of all the nodes at once, each node keeps its last image
+        node_images = await asyncio.gather(*[asyncio.gather(*fetches) for fetches in node_fetches])
+        output_images = [images[-1] for images in node_images if images]
 
         if len(output_images) == 0:
             raise RuntimeError("No output images")
@@ -236,8 +455,7 @@ class ComfyUplift(AbstractUpliftModel):
 
     def _is_safe(self, text):
         # Filter 1
-        adjusted_text = text.replace("\"", " ").replace("'", " ").replace(",", " ").replace(".", " ")
-        if profanity.contains_profanity(text) or profanity.contains_profanity(adjusted_text):
+        if self._profanity_matcher is not None and _contains_profanity(self._profanity_matcher, text):
             return False
 
         # Filter 2
@@ -245,68 +463,95 @@ class ComfyUplift(AbstractUpliftModel):
 
         return True
 
-    async def generate(self, progress_model: ui.SimpleFloatModel = None, **kwargs) -> Tuple[list, list]:
-        if self.busy:
-            carb.log_warn("Comfy is busy")
-            return
-
-        self.busy = True
+    def _decode_result(self, result: bytes) -> Tuple[bytes, list]:
+        """Decode the image returned by ComfyUI to RGBA bytes and [width, height]"""
+        if _turbo_jpeg is not None and result[:3] == b"\xff\xd8\xff":
+            # JPEG results go through libjpeg-turbo's SIMD decoder
+            rgba = _turbo_jpeg.decode(result, pixel_format=TJPF_RGBA)
+            return rgba.tobytes(), [rgba.shape[1], rgba.shape[0]]
+
+        image = Image.open(BytesIO(result))
+        imageSize = [image.width, image.height]
+        rgba_image = image.convert("RGBA")
+        pixels = rgba_image.tobytes()
+        return pixels, imageSize
+
+    async def generate(self, progress_model: ui.SimpleFloatModel = None, **kwargs) -> Tuple[bytes, list]:
+        # Snapshot the buffers, they can be replaced by the next capture while we wait for a slot
+        viewport_buffers = self._viewport_buffers
+        slot = await self._free_slots.get()
+        # ComfyUI queues the prompt under the id it's given, so its completion can be registered before the POST
+        prompt_id = str(uuid.uuid4())
 
         try:
             if progress_model:
                 progress_model.set_value(0.2)
             generation_params = self._parameters.copy()
             generation_params.update(kwargs)
-            generation_params.update(self._viewport_buffers)
-
-            json_prompt = self._generate_prompt(generation_params)
+            generation_params.update(viewport_buffers)
 
-            merged_prompts = ""
-            for key in self._parameters.keys():
-                merged_prompts += self._parameters[key] + "\n"
+            # Only the text parameters need to go through the safety filter
+            text_params = [generation_params[p["name"]] for p in self._comfy_parameters if p["type"] == "string"]
+            merged_prompts = "\n".join(text_params)
 
             print(merged_prompts)
-            if len(merged_prompts) > 0:
-                if not self._is_safe(merged_prompts):
+            # The prompts usually don't change between generations, no need to scan them again
+            if len(merged_prompts) > 0 and merged_prompts != self._last_safe_prompts:
+                if self._is_safe(merged_prompts):
+                    self._last_safe_prompts = merged_prompts
+                else:
                     print("Not safe")
                     imageSize = [1024, 1024]
-                    data = np.zeros(imageSize)
-                    rgba_image = Image.fromarray(data, mode="RGBA")
-                    pixels = list(rgba_image.getdata())
+                    # Black transparent RGBA image, bytes() gives the zero-filled buffer directly
+                    pixels = bytes(imageSize[0] * imageSize[1] * 4)
                     return pixels, imageSize
 
+            # Listen before queuing the prompt so the completion event can't be missed. The connection is made while
+            # the buffers are uploading.
+            uploaded_buffers, ws = await asyncio.gather(
+                self._upload_viewport_buffers(viewport_buffers, slot), self._ensure_ws()
+            )
+
+            # The prompt template is shared, it's serialized before any other generation can write to it
+            json_prompt = self._generate_prompt(generation_params, uploaded_buffers)
             request_data = {
                 "prompt": json_prompt,
                 "client_id": self._websocket_client_id,
+                "prompt_id": prompt_id,
             }
 
-            data = json.dumps(request_data).encode("utf-8")
+            data = orjson.dumps(request_data)
             headers = {"Content-Type": "application/json"}
-            req = request.Request("http://{}/prompt".format(self._comfy_url), data=data, headers=headers)
-            prompt_id = json.loads(request.urlopen(req).read())["prompt_id"]
+            prompt_url = "http://{}/prompt".format(self._comfy_url)
+            self._register_pending(prompt_id, ws)
+            async with self._get_session().post(prompt_url, data=data, headers=headers) as response:
+                queued_id = orjson.loads(await response.read())["prompt_id"]
+            if queued_id != prompt_id:
+                # Older ComfyUI versions pick their own id, its events are only resolved from now on
+                self._pop_pending(prompt_id)
+                prompt_id = queued_id
+                self._register_pending(prompt_id, ws)
 
             if progress_model:
                 progress_model.set_value(0.3)
-            output_images = []
 
-            output_images = self._get_images(prompt_id, self._comfy_url)
+            output_images = await self._get_images(prompt_id, self._comfy_url)
+
             if output_images:
                 # print(f"Received {len(output_images)} images")
 
-                image_base64 = base64.b64encode(output_images[0]).decode()
-                image_file = BytesIO(base64.b64decode(image_base64))
-                image = Image.open(image_file)
-
-                # image = Image.open(BytesIO(output_images[0][8:]))
-                imageSize = [image.width, image.height]
-                rgba_image = image.convert("RGBA")
-                pixels = list(rgba_image.getdata())
-                return pixels, imageSize
+                # Decoding is CPU bound, keep it off the event loop
+                return await asyncio.to_thread(self._decode_result, output_images[0])
 
         except Exception as e:
             carb.log_error(f"An error occurred during generation: {e}")
         finally:
-            self.busy = False
+            # _get_images pops it once waited on, this covers the failures before the wait
+            self._pop_pending(prompt_id)
+            self._free_slots.put_nowait(slot)
+
+        # Failed, the callers unpack the result so it's still a pair
+        return None, None
 
     def destroy(self):
-        pass
+        asyncio.ensure_future(self._close_connections())
@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: LicenseRef-NvidiaProprietary
+#
+# NVIDIA CORPORATION, its affiliates and licensors retain all intellectual
+# property and proprietary rights in and to this material, related
+# documentation and any modifications thereto. Any use, reproduction,
+# disclosure or distribution of this material and related documentation
+# without an express license agreement from NVIDIA CORPORATION or
+# its affiliates is strictly prohibited.
+
+from omni.kit.test import AsyncTestCase
+
+from ..models.comfy_ui.comfy_uplift import EXT_ROOT, _contains_profanity, _load_profanity_matcher
+
+
+class TestProfanity(AsyncTestCase):
+    async def setUp(self):
+        # The extension's list is empty, so this is the better_profanity list it falls back to
+        self._matcher = _load_profanity_matcher(f"{EXT_ROOT}/data/profanity_wordlist.txt")
+
+    async def test_known_positives(self):
+        """Texts caught by the better_profanity censor the filter replaced"""
+        self.assertIsNotNone(self._matcher)
+        for text in (
+            "fuck",
+            "FUCK",
+            "Fuck, that",
+            '"fuck"',
+            "fuck's",
+            "f*ck",
+            "fvck",
+            "s1ut",
+            "sh1t bull",
+            "5h17",
+            "a$$hole",
+            "b1tch.",
+            "what a bull shit idea",
+            "bullshit",
+        ):
+            with self.subTest(text=text):
+                self.assertTrue(_contains_profanity(self._matcher, text))
+
+    async def test_known_negatives(self):
+        """Texts let through by the better_profanity censor, the words are only matched whole"""
+        for text in (
+            "A glass mug on the counter, cinematic lighting",
+            "classic",
+            "a cocktail",
+            "assassin",
+            "assess the mass",
+            "the shitake",
+            "Scunthorpe",
+        ):
+            with self.subTest(text=text):
+                self.assertFalse(_contains_profanity(self._matcher, text))
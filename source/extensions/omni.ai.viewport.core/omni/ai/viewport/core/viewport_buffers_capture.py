@@ -10,21 +10,80 @@
 
 __all__ = ["ViewportBuffers"]
 
-import base64
+import asyncio
 import ctypes
 import io
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import List, Tuple
 
 import carb
 import numpy as np
 import omni.kit.viewport.utility as vp_util
 import omni.ui as ui
-from omni.kit.widget.viewport.capture import ByteCapture, MultiAOVByteCapture
-from PIL import Image
-from pxr import Sdf, Usd, UsdGeom, UsdRender
+from pxr import Sdf, Tf, Usd, UsdGeom, UsdRender
 import omni.kit.app
 
+# Own prototype of PyCapsule_GetPointer so the shared ctypes.pythonapi function is not reconfigured on every capture
+_capsule_get_pointer = ctypes.PYFUNCTYPE(ctypes.c_void_p, ctypes.py_object, ctypes.c_char_p)(
+    ("PyCapsule_GetPointer", ctypes.pythonapi)
+)
+
+# Visibility modes of the capture types that hide prims around the capture
+VISIBILITY_MODES = ("hideme", "hideothers", "walls_hideothers", "walls_hideme")
+# Frames for the renderer to catch up with a visibility change
+FRAMES_TO_WAIT = 5
+# Hidden in the depth captures
+DEPTH_HIDDEN_PRIM_PATH = "/World/Assets/KitchenBase/Kitchen/window1/window_pane"
+
+# Print statistics of the depth captures, each one is a full pass over the image
+_DEBUG_DEPTH = False
+
+# Depth values with a magnitude above this are the "infinity" clear value of the renderer
+DEPTH_INF_THRESHOLD = 3.402e38
+# Absolute depth range mapped to black..white, so the depth of all the captures is aligned
+DEPTH_MAX = -200
+DEPTH_MIN = DEPTH_MAX - 400
+
+
+def _depth_to_u8(depth: np.ndarray) -> np.ndarray:
+    """
+    Flip and normalize the linear depth to [0, 255] uint8 between DEPTH_MIN and DEPTH_MAX, invalid depth is white
+
+    Works in a single float32 scratch buffer to keep the number of passes over the image low.
+    """
+    scale = 255.0 / (DEPTH_MAX - DEPTH_MIN)
+    # (-depth - DEPTH_MIN) * scale
+    scaled = np.multiply(depth, -scale, dtype=np.float32)
+    np.subtract(scaled, DEPTH_MIN * scale, out=scaled)
+    # fmin ignores NaN, so NaN and the negative "infinity" (flipped to +inf) end up white
+    np.fmin(scaled, 255, out=scaled)
+    np.maximum(scaled, 0, out=scaled)
+    # The positive "infinity" flips to the black end, it is invalid too
+    np.putmask(scaled, depth >= DEPTH_INF_THRESHOLD, 255)
+    return scaled.astype(np.uint8)
+
+
+@dataclass
+class VisibilityPlan:
+    """Visibility attributes to hide before a capture and to restore after it"""
+
+    hide_attrs: list = field(default_factory=list)
+    restore_attrs: list = field(default_factory=list)
+    frames_to_wait: int = 0
+
+
+def _image_from_array(array: np.ndarray, mode: str):
+    """Wrap the uint8 array in a PIL image without copying it, the array memory must outlive the image"""
+    # Imported on the first capture, not when the extension starts
+    from PIL import Image
+
+    array = np.ascontiguousarray(array)
+    height, width = array.shape[:2]
+    return Image.frombuffer(mode, (width, height), array, "raw", mode, 0, 1)
+
 
 class ViewportBuffersCapture:
     def __init__(self):
@@ -42,6 +101,28 @@ class ViewportBuffersCapture:
 
         self._send_image_fn = None
 
+        self._app = omni.kit.app.get_app()
+        self._bus = self._app.get_message_bus_event_stream()
+        self._backdrop_event_type = carb.events.type_from_string("setBackdropVariant")
+        self._sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
+
+        # Reused uint8 output of the float buffer conversions per control name, reallocated when the viewport size
+        # changes
+        self._u8_scratch = {}
+        # Function converting the captured buffer to a PIL image, per (control_name, aov_name, pixel_format)
+        self._converters = {}
+
+        # VisibilityPlan per (aov_name, asset_path, visibility) of the capture types
+        self._visibility_plans: dict = {}
+        self._visibility_plans_stage = None
+        self._stage_listener = None
+
+        # The resize and PNG encode run here so the capture callback returns quickly
+        self._encode_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="viewport_buffers_encode")
+        self._encode_futures = []
+        # PNG output buffer of each encode thread, kept between captures so it doesn't regrow every time
+        self._encode_local = threading.local()
+
     @property
     def supported_buffer_types(self):
         return self._supported_buffer_types
@@ -83,152 +164,109 @@ class ViewportBuffersCapture:
 
     def set_active_capture_types(self, capture_types: List[Tuple[str, str, str, str]]):
         self.active_capture_types = capture_types
+        self._visibility_plans.clear()
+        self._converters.clear()
+
+    def _get_u8_scratch(self, control_name, shape) -> np.ndarray:
+        scratch = self._u8_scratch.get(control_name)
+        if scratch is None or scratch.shape != shape:
+            scratch = self._u8_scratch[control_name] = np.empty(shape, dtype=np.uint8)
+        return scratch
+
+    def _make_converter(self, pixel_format, control_name):
+        """Return the function converting a captured buffer of the pixel format to a PIL image"""
+        if pixel_format == pixel_format.RGBA8_UNORM:
+            dtype, n_channels, to_image = np.uint8, 4, self._rgba8_to_image
+        elif pixel_format == pixel_format.R32_SFLOAT:
+            dtype, n_channels, to_image = np.float32, 1, self._depth_to_image
+        elif pixel_format == pixel_format.RGBA16_SFLOAT:
+            dtype, n_channels, to_image = np.float16, 4, self._rgba16f_to_image
+        elif pixel_format == pixel_format.RGBA32_SFLOAT:
+            dtype, n_channels, to_image = np.float32, 4, self._normals_to_image
+        else:
+            raise ValueError(f"Unsupported pixel format: {pixel_format}")
+
+        pod_size = np.dtype(dtype).itemsize
+
+        def convert(buffer, buffer_size, width, height):
+            assert width * height * n_channels == (buffer_size / pod_size)
+            # View of the captured buffer through the buffer protocol, no copy
+            content = (ctypes.c_ubyte * buffer_size).from_address(_capsule_get_pointer(buffer, None))
+            np_array = np.frombuffer(content, dtype=dtype).reshape(height, width, n_channels)
+            return to_image(np_array, control_name)
+
+        return convert
+
+    def _rgba8_to_image(self, np_array, control_name):
+        # The captured buffer is released when the callback returns, the encode pool needs its own copy
+        return _image_from_array(np_array.copy(), "RGBA")
+
+    def _depth_to_image(self, np_array, control_name):
+        depth_array = np_array.squeeze()  # Remove single-dimensional entries
+
+        if _DEBUG_DEPTH:
+            # Replace "infinity" values with NaN so they are ignored by the statistics
+            depth_array = np.where(np.abs(depth_array) < DEPTH_INF_THRESHOLD, depth_array, np.nan)
+
+            print(f"Depth array shape: {depth_array.shape}")
+            print(f"Depth min: {np.nanmin(depth_array)}, max: {np.nanmax(depth_array)}")
+            print(f"Number of nan values: {np.sum(np.isnan(depth_array))}")
+            print(f"Number of negative values: {np.sum(depth_array < 0)}")
+            print(f"Number of positive values: {np.sum(depth_array > 0)}")
+            print(f"Number of finite values: {np.sum(np.isfinite(depth_array))}")
+
+            # Histogram of the flipped depth over the normalized range, out of range values go to the end bins and
+            # NaN to an 11th bin that isn't printed
+            bins = np.multiply(np.add(depth_array, DEPTH_MIN), -10.0 / (DEPTH_MAX - DEPTH_MIN))
+            np.clip(bins, 0, 9, out=bins)
+            np.nan_to_num(bins, copy=False, nan=10)
+            hist = np.bincount(bins.astype(np.uint8).ravel(), minlength=11)[:10]
+            bin_edges = np.linspace(DEPTH_MIN, DEPTH_MAX, 11)
+            print("Depth histogram:")
+            for i, (count, edge) in enumerate(zip(hist, bin_edges[:-1])):
+                print(f"\tBin {i}: {edge:.2f} to {bin_edges[i+1]:.2f}: {count} values")
+
+        depth_norm_time = time.time()
+        im = _image_from_array(_depth_to_u8(depth_array), "L")
+        carb.log_verbose(f"Total time for depth processing: {time.time() - depth_norm_time:.4f} seconds")
+
+        # Save debug image
+        # debug_image_path = "debug_depth_image.png"
+        # im.save(debug_image_path)
+        # print(f"Debug depth image saved to: {debug_image_path}")
+        return im
+
+    def _rgba16f_to_image(self, np_array, control_name):
+        # Scale and convert straight into the uint8 buffer, without a float32 temporary
+        rgba = self._get_u8_scratch(control_name, np_array.shape)
+        np.multiply(np_array, 255, out=rgba, casting="unsafe")
+        return _image_from_array(rgba, "RGBA")
+
+    def _normals_to_image(self, np_array, control_name):
+        # Normals from [-1, 1] to [0, 255]: x * 127.5 + 127.5
+        normals = np.multiply(np_array, 127.5)
+        normals += 127.5
+        rgba = self._get_u8_scratch(control_name, np_array.shape)
+        np.copyto(rgba, normals, casting="unsafe")
+        return _image_from_array(rgba, "RGBA")
 
     def _on_viewport_captured(
         self, buffer, buffer_size, width, height, pixel_format, aov_name, control_name  # , capture_buffer_key, masking
     ):
-        print(
+        carb.log_verbose(
             f"Callback invoked for AOV: {aov_name} @ {width} x {height} with format: {pixel_format}, buffer_size: {buffer_size}"
         )
         start_time = time.time()
         try:
-            # Parsing pixel format to get the buffer and convert it to numpy array
-            if pixel_format == pixel_format.RGBA8_UNORM:
-                pod_type, pod_size, n_channels = ctypes.c_ubyte, 1, 4
-                dtype = np.uint8
-            elif pixel_format == pixel_format.R32_SFLOAT:
-                pod_type, pod_size, n_channels = ctypes.c_float, 4, 1
-                dtype = np.float32
-            elif pixel_format == pixel_format.RGBA16_SFLOAT:
-                pod_type, pod_size, n_channels = ctypes.c_ushort, 2, 4
-                dtype = np.float16
-            elif pixel_format == pixel_format.RGBA32_SFLOAT:
-                pod_type, pod_size, n_channels = ctypes.c_float, 4, 4
-                dtype = np.float32
-            else:
-                raise ValueError(f"Unsupported pixel format: {pixel_format}")
-
-            array_len = width * height * n_channels
-            assert array_len == (buffer_size / pod_size)
-
-            ctypes.pythonapi.PyCapsule_GetPointer.restype = ctypes.POINTER(pod_type)
-            ctypes.pythonapi.PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
-
-            content = ctypes.pythonapi.PyCapsule_GetPointer(buffer, None)
-
-            np_array_time = time.time()
-            np_array = np.ctypeslib.as_array(content, shape=(height, width, n_channels)).astype(dtype)
-            print(f"Time to create numpy array: {time.time() - np_array_time:.4f} seconds")
-
-            # Convert the depth (numpy) array to PIL image handling RGB or depth
-            if pixel_format == pixel_format.RGBA8_UNORM:
-                im = Image.fromarray(np_array, "RGBA")
-            elif pixel_format == pixel_format.R32_SFLOAT:
-                depth_array = np_array.squeeze()  # Remove single-dimensional entries
-
-                # Define a threshold for "infinity" (adjust if needed)
-                # Replace "infinity" values with NaN (to be clamped)
-                inf_threshold = -3.402e38
-                depth_array[depth_array <= inf_threshold] = np.nan
-                inf_threshold = 3.402e38
-                depth_array[depth_array >= inf_threshold] = np.nan
-
-                # Debug information
-                print(f"Depth array shape: {depth_array.shape}")
-                print(f"Depth min: {np.nanmin(depth_array)}, max: {np.nanmax(depth_array)}")
-                print(f"Number of nan values: {np.sum(np.isnan(depth_array))}")
-                print(f"Number of negative values: {np.sum(depth_array < 0)}")
-                print(f"Number of positive values: {np.sum(depth_array > 0)}")
-                print(f"Number of finite values: {np.sum(np.isfinite(depth_array))}")
-
-                # You can flip depth values here
-                depth_array = -depth_array
-
-                # Histogram of depth values for debugging
-                hist, bin_edges = np.histogram(depth_array[np.isfinite(depth_array)], bins=10)
-                print("Depth histogram:")
-                for i, (count, edge) in enumerate(zip(hist, bin_edges[:-1])):
-                    print(f"\tBin {i}: {edge:.2f} to {bin_edges[i+1]:.2f}: {count} values")
-
-                depth_norm_time = time.time()
-                valid_depths = depth_array[np.isfinite(depth_array) & (depth_array < 0)]
-                if valid_depths.size > 0:
-                    percentile_time = time.time()
-                    depth_min = np.min(valid_depths)
-                    depth_max = np.max(valid_depths)
-
-                    print(f"Time to calculate percentiles: {time.time() - percentile_time:.4f} seconds")
-                    print(f"Depth range: min = {depth_min}, max = {depth_max}")
-
-                    normalize_time = time.time()
-                    # Replace invalid values with max depth before normalization
-                    depth_array_clean = np.where(np.isfinite(depth_array), depth_array, 0)
-                    normalized_depth = np.clip((depth_array_clean - depth_min) / (depth_max - depth_min), 0, 1)
-
-                    # This is good because its absolute - all depth will be aligned
-                    depth_max = -200
-                    depth_min = depth_max - 400
-                    normalized_depth = np.clip((depth_array_clean - depth_min) / (depth_max - depth_min), 0, 1)
-
-                    # This is good bc its easier for user to set it to a meaningful value, but depth will be relatively
-                    # aligned
-                    # depth_max = 1.0
-                    # depth_min = 0.8
-                    # normalized_depth = np.clip((normalized_depth - depth_min) / (depth_max - depth_min), 0, 1)
-                    # Invert colors (1 - color)
-                    final_depth = normalized_depth
-
-                    print(f"Time to normalize, apply gamma, and invert: {time.time() - normalize_time:.4f} seconds")
-                else:
-                    final_depth = np.ones_like(depth_array)  # Set to white if no valid depths
-                    print("Warning: No valid depth values found")
-
-                print(f"Final depth min: {np.min(final_depth)}, max: {np.max(final_depth)}")
-
-                im = Image.fromarray((final_depth * 255).astype(np.uint8), "L")
-                print(f"Total time for depth processing: {time.time() - depth_norm_time:.4f} seconds")
-
-                # Save debug image
-                # debug_image_path = "debug_depth_image.png"
-                # im.save(debug_image_path)
-                # print(f"Debug depth image saved to: {debug_image_path}")
-            elif pixel_format == pixel_format.RGBA16_SFLOAT:
-                im = Image.fromarray((np_array * 255).astype(np.uint8), "RGBA")
-            elif pixel_format == pixel_format.RGBA32_SFLOAT:
-                im = Image.fromarray((((np_array * 0.5) + 0.5) * 255).astype(np.uint8), "RGBA")
-            else:
-                im = None
-
-            if im:
-                resize_time = time.time()
-                aspect = im.width / im.height
-                if self._target_size[0] > 0 and self._target_size[1] > 0:
-                    sizex = int(self._target_size[0] * aspect)
-                    sizey = int(self._target_size[1])
-                    self._image_size = [sizex, sizey]
-                    im_resized = im.resize((sizex, sizey))
-                else:
-                    im_resized = im
-                print(f"Time to resize image: {time.time() - resize_time:.4f} seconds")
-
-                encode_time = time.time()
-                buffer = io.BytesIO()
-                path = "buffer_" + control_name + ".png"
-                # im_resized.save(path)
-                # print(f"Debug image saved to: {path}")
-
-                im_resized.save(buffer, format="PNG")
-                imgString = base64.b64encode(buffer.getvalue()).decode()
-                print(f"Time to encode image: {time.time() - encode_time:.4f} seconds")
-
-                print(f"Captured {aov_name} buffer of size {len(imgString)} bytes")
-                # self._viewport_buffers[aov_name] = imgString
-                # self._viewport_buffers[capture_buffer_key] = imgString
-                self._viewport_buffers[control_name] = imgString
-
-                if self._send_image_fn:
-                    self._send_image_fn(None, None, im, "BufferTransferEvent", control_name, max_size=256)
-
+            # A workflow or mode switch can map the control name to another buffer or format, so they are in the key
+            key = (control_name, aov_name, pixel_format)
+            converter = self._converters.get(key)
+            if converter is None:
+                converter = self._make_converter(pixel_format, control_name)
+                self._converters[key] = converter
+
+            im = converter(buffer, buffer_size, width, height)
+            self._encode_futures.append(self._encode_pool.submit(self._encode_and_store, im, aov_name, control_name))
         except Exception as e:
             carb.log_error(f"Error in viewport capture: {str(e)}")
             import traceback
@@ -236,203 +274,201 @@ class ViewportBuffersCapture:
             print(traceback.format_exc())
 
         finally:
-            print(f"Total time for _on_viewport_captured: {time.time() - start_time:.4f} seconds")
+            carb.log_verbose(f"Total time for _on_viewport_captured: {time.time() - start_time:.4f} seconds")
+
+    def _encode_and_store(self, im, aov_name, control_name):
+        """
+        Resize and encode the captured image to PNG, runs in the encode pool. Return the image and the control name
+        for the preview, which is sent from the loop by _wait_for_encodes, or None on error
+        """
+        try:
+            resize_time = time.time()
+            target_size = self._get_capture_size(im.width, im.height)
+            if target_size:
+                self._image_size = target_size
+                im_resized = im.resize(target_size)
+            else:
+                im_resized = im
+            carb.log_verbose(f"Time to resize image: {time.time() - resize_time:.4f} seconds")
+
+            encode_time = time.time()
+            buffer = getattr(self._encode_local, "png_buffer", None)
+            if buffer is None:
+                buffer = self._encode_local.png_buffer = io.BytesIO()
+            # Overwrite from the start without truncating, truncate would give the memory back
+            buffer.seek(0)
+            # path = "buffer_" + control_name + ".png"
+            # im_resized.save(path)
+            # print(f"Debug image saved to: {path}")
+
+            # The PNG is only uploaded to ComfyUI, fast deflate is worth a few more bytes
+            im_resized.save(buffer, format="PNG", compress_level=1)
+            with buffer.getbuffer() as view:
+                png_bytes = view[: buffer.tell()].tobytes()
+            carb.log_verbose(f"Time to encode image: {time.time() - encode_time:.4f} seconds")
+
+            carb.log_verbose(f"Captured {aov_name} buffer of size {len(png_bytes)} bytes")
+            self._viewport_buffers[control_name] = png_bytes
+            return im, control_name
+        except Exception as e:
+            carb.log_error(f"Error encoding viewport capture {control_name}: {str(e)}")
+            return None
+
+    def _get_capture_size(self, width, height):
+        """Size of the captured buffers for a viewport of width x height, None when there is no target size"""
+        if self._target_size[0] > 0 and self._target_size[1] > 0:
+            aspect = width / height
+            return [int(self._target_size[0] * aspect), int(self._target_size[1])]
+        return None
+
+    async def _wait_for_encodes(self):
+        """Wait for the images submitted to the encode pool to be stored"""
+        futures, self._encode_futures = self._encode_futures, []
+        if not futures:
+            return
+
+        results = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+
+        # The previews go through the message bus, which is only used from the main thread
+        if self._send_image_fn:
+            for result in results:
+                if result is not None:
+                    im, control_name = result
+                    self._send_image_fn(None, None, im, "BufferTransferEvent", control_name, max_size=256)
+
+    def _on_objects_changed(self, notice, stage):
+        # Prims added, removed or renamed, the plans have to be resolved again
+        if notice.GetResyncedPaths():
+            self._visibility_plans.clear()
+
+    def _get_visibility_plan(self, stage, aov_name: str, asset_path: str, visibility: str) -> VisibilityPlan:
+        """Return the visibility plan of a capture type, resolved on its first capture"""
+        if stage != self._visibility_plans_stage:
+            self._visibility_plans.clear()
+            self._visibility_plans_stage = stage
+            if self._stage_listener:
+                self._stage_listener.Revoke()
+            self._stage_listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+        key = (aov_name, asset_path, visibility)
+        plan = self._visibility_plans.get(key)
+        if plan is None:
+            plan = self._make_visibility_plan(stage, aov_name, asset_path, visibility)
+            self._visibility_plans[key] = plan
+        return plan
+
+    def _make_visibility_plan(self, stage, aov_name: str, asset_path: str, visibility: str) -> VisibilityPlan:
+        def siblings(path, include_self):
+            prim = stage.GetPrimAtPath(path)
+            parent_prim = prim.GetParent()
+            if not parent_prim.IsValid():
+                return []
+            return [
+                sibling_prim.GetAttribute("visibility")
+                for sibling_prim in parent_prim.GetChildren()
+                if include_self or prim != sibling_prim
+            ]
+
+        plan = VisibilityPlan()
+        if visibility == "hideme":
+            prim = stage.GetPrimAtPath(asset_path)
+            if prim.IsValid():
+                plan.hide_attrs = [prim.GetAttribute("visibility")]
+                plan.restore_attrs = list(plan.hide_attrs)
+        elif visibility == "hideothers":
+            plan.hide_attrs = siblings(asset_path, False)
+            plan.restore_attrs = list(plan.hide_attrs)
+        elif visibility == "walls_hideothers":
+            walls_path = asset_path + "/Kitchen/walls"
+            plan.hide_attrs = siblings(asset_path, False) + siblings(walls_path, False)
+            plan.restore_attrs = siblings(asset_path, True) + siblings(walls_path, True)
+        elif visibility == "walls_hideme":
+            # Everything in the kitchen but the walls with the window, countertops and cabinets
+            kitchen_attrs = []
+            parent_prim = stage.GetPrimAtPath(asset_path + "/Kitchen/walls").GetParent()
+            if parent_prim.IsValid():
+                for sibling_prim in parent_prim.GetChildren():
+                    if sibling_prim.GetName() not in ("window1", "countertops", "cabinets"):
+                        kitchen_attrs.append(sibling_prim.GetAttribute("visibility"))
+
+            prim = stage.GetPrimAtPath(asset_path + "/Kitchen/window1/window")
+            if prim.IsValid():
+                kitchen_attrs.append(prim.GetAttribute("visibility"))
+
+            plan.hide_attrs = siblings(asset_path, False) + kitchen_attrs
+            plan.restore_attrs = siblings(asset_path, True) + kitchen_attrs
+        if visibility in VISIBILITY_MODES:
+            plan.frames_to_wait = FRAMES_TO_WAIT
+
+        if aov_name == "DepthLinearized":
+            prim = stage.GetPrimAtPath(DEPTH_HIDDEN_PRIM_PATH)
+            if prim.IsValid():
+                plan.hide_attrs.append(prim.GetAttribute("visibility"))
+                plan.restore_attrs.append(prim.GetAttribute("visibility"))
+            plan.frames_to_wait = FRAMES_TO_WAIT
+
+        return plan
+
+    def _get_capture_batches(self):
+        """
+        Group the capture types needing the same prims hidden, so they are captured in a single pass
+
+        Return a list of (VisibilityPlan, [(aov_name, control_name), ...])
+        """
+        batches = {}
+        for aov_name, control_name, asset_path, visibility in self.active_capture_types:
+            plan = self._get_visibility_plan(self._viewport.stage, aov_name, asset_path, visibility)
+            key = (
+                tuple(str(attr.GetPath()) for attr in plan.hide_attrs),
+                tuple(str(attr.GetPath()) for attr in plan.restore_attrs),
+            )
+            entry = batches.setdefault(key, [plan, []])
+            if any(aov_name == batch_aov for batch_aov, _ in entry[1]):
+                # The same AOV can only be captured once per pass, it will be in a batch of its own
+                batches[(key, control_name)] = [plan, [(aov_name, control_name)]]
+                continue
+            # Wait for the longest of the plans of the batch
+            if plan.frames_to_wait > entry[0].frames_to_wait:
+                entry[0] = plan
+            entry[1].append((aov_name, control_name))
+        return [tuple(entry) for entry in batches.values()]
 
     # Capture the viewport and convert it to a scaled base64 encoded imagePrompt String
     async def capture_viewport_async(self):
+        from omni.kit.widget.viewport.capture import MultiAOVByteCapture
+
         if not self._viewport:
             self._viewport = vp_util.get_active_viewport()
         # Make sure the render var are present
         self._add_render_vars(self._viewport.stage, self._viewport.render_product_path, self.active_buffer_types, True)
 
-        FRAMES_TO_WAIT = 5
-        i = 0
-        for aov_name, control_name, asset_path, visibility in self.active_capture_types:
-            frames_to_wait = 0
-            if visibility == "hideme":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("invisible")
-                    # prim.SetActive(False)
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "hideothers":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if prim != sibling_prim:
-                            prim_visibility = sibling_prim.GetAttribute("visibility")
-                            prim_visibility.Set("invisible")
-                            # sibling_prim.SetActive(False)
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "walls_hideothers":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if prim != sibling_prim:
-                            prim_visibility = sibling_prim.GetAttribute("visibility")
-                            prim_visibility.Set("invisible")
-                            # sibling_prim.SetActive(False)
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/walls")
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if prim != sibling_prim:
-                            prim_visibility = sibling_prim.GetAttribute("visibility")
-                            prim_visibility.Set("invisible")
-                            # sibling_prim.SetActive(False)
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "walls_hideme":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if prim != sibling_prim:
-                            prim_visibility = sibling_prim.GetAttribute("visibility")
-                            prim_visibility.Set("invisible")
-                            # sibling_prim.SetActive(False)
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/walls")
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if sibling_prim.GetName() == "window1":
-                            continue
-                        if sibling_prim.GetName() == "countertops":
-                            continue
-                        if sibling_prim.GetName() == "cabinets":
-                            continue
-                        prim_visibility = sibling_prim.GetAttribute("visibility")
-                        prim_visibility.Set("invisible")
-                        # sibling_prim.SetActive(False)
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/window1/window")
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("invisible")
-                    #prim.SetActive(False)
-                frames_to_wait = FRAMES_TO_WAIT
-
-            if aov_name == "DepthLinearized":
-                win_asset_path = "/World/Assets/KitchenBase/Kitchen/window1/window_pane"
-                prim = self._viewport.stage.GetPrimAtPath(win_asset_path)
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("invisible")
-                    #prim.SetActive(False)
-                frames_to_wait = FRAMES_TO_WAIT
-            if frames_to_wait > 0:
-                await vp_util.next_viewport_frame_async(self._viewport, n_frames=frames_to_wait)
+        for plan, batch in self._get_capture_batches():
+            for prim_visibility in plan.hide_attrs:
+                prim_visibility.Set("invisible")
+            if plan.frames_to_wait > 0:
+                await vp_util.next_viewport_frame_async(self._viewport, n_frames=plan.frames_to_wait)
 
+            aov_names = []
             callback_fns = []
-            callback_fns.append(
-                lambda buffer, buffer_size, width, height, fmt, aov_name=aov_name, control_name=control_name: self._on_viewport_captured(
-                    buffer, buffer_size, width, height, fmt, aov_name, control_name  # , asset_path, True
+            for aov_name, control_name in batch:
+                aov_names.append(aov_name)
+                callback_fns.append(
+                    lambda buffer, buffer_size, width, height, fmt, aov_name=aov_name, control_name=control_name: self._on_viewport_captured(
+                        buffer, buffer_size, width, height, fmt, aov_name, control_name  # , asset_path, True
+                    )
                 )
-            )
-            capture = self._viewport.schedule_capture(MultiAOVByteCapture([aov_name], callback_fns))
+            # The previous capture may still be encoding from the uint8 buffers
+            await self._wait_for_encodes()
+            capture = self._viewport.schedule_capture(MultiAOVByteCapture(aov_names, callback_fns))
             # await capture.wait_for_result(completion_frames=10)
             await capture.wait_for_result()
 
-            frames_to_wait = 0
-            if visibility == "hideme":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("inherited")
-                    # prim.ClearActive()
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "hideothers":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if prim != sibling_prim:
-                            prim_visibility = sibling_prim.GetAttribute("visibility")
-                            prim_visibility.Set("inherited")
-                            # sibling_prim.ClearActive()
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "walls_hideothers":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        prim_visibility = sibling_prim.GetAttribute("visibility")
-                        prim_visibility.Set("inherited")
-                        # sibling_prim.ClearActive()
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/walls")
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        prim_visibility = sibling_prim.GetAttribute("visibility")
-                        prim_visibility.Set("inherited")
-                        # sibling_prim.ClearActive()
-                frames_to_wait = FRAMES_TO_WAIT
-            elif visibility == "walls_hideme":
-                prim = self._viewport.stage.GetPrimAtPath(asset_path)
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        prim_visibility = sibling_prim.GetAttribute("visibility")
-                        prim_visibility.Set("inherited")
-                        # sibling_prim.ClearActive()
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/walls")
-                parent_prim = prim.GetParent()
-
-                # Go through siblings
-                if parent_prim.IsValid():
-                    for sibling_prim in parent_prim.GetChildren():
-                        if sibling_prim.GetName() == "window1":
-                            continue
-                        if sibling_prim.GetName() == "countertops":
-                            continue
-                        if sibling_prim.GetName() == "cabinets":
-                            continue
-                        prim_visibility = sibling_prim.GetAttribute("visibility")
-                        prim_visibility.Set("inherited")
-                        # sibling_prim.ClearActive()
-
-                prim = self._viewport.stage.GetPrimAtPath(asset_path + "/Kitchen/window1/window")
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("inherited")
-                    # prim.ClearActive()
-                frames_to_wait = FRAMES_TO_WAIT
-
-            if aov_name == "DepthLinearized":
-                win_asset_path = "/World/Assets/KitchenBase/Kitchen/window1/window_pane"
-                prim = self._viewport.stage.GetPrimAtPath(win_asset_path)
-                if prim.IsValid():
-                    prim_visibility = prim.GetAttribute("visibility")
-                    prim_visibility.Set("inherited")
-                    # prim.ClearActive()
-                frames_to_wait = FRAMES_TO_WAIT
-            if frames_to_wait > 0:
-                await vp_util.next_viewport_frame_async(self._viewport, n_frames=frames_to_wait)
-            i += 1
+            for prim_visibility in plan.restore_attrs:
+                prim_visibility.Set("inherited")
+            if plan.frames_to_wait > 0:
+                await vp_util.next_viewport_frame_async(self._viewport, n_frames=plan.frames_to_wait)
+
+        await self._wait_for_encodes()
 
         #prim_lakeview = self._viewport.stage.GetPrimAtPath("/World/Cameras/ProjectionTemplate_LakeView")
         prim_lakeview = self._viewport.stage.GetPrimAtPath("/World/HDRI_backgrounds/Projection_LakeView")
@@ -450,32 +486,10 @@ class ViewportBuffersCapture:
         prim_edify_visibility_value = prim_edify_visibility.Get()
 
         if prim_lakeview_visibility_value == "inherited" and prim_lookout_visibility_value == "inherited" and prim_edify_visibility_value == "inherited":
-            new_payload = {"variant": "Lake_view"}
-            _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-            new_event_type = carb.events.type_from_string("setBackdropVariant")
-            bus = omni.kit.app.get_app().get_message_bus_event_stream()
-            bus.push(new_event_type, sender=_sender_id, payload=new_payload)
-            app = omni.kit.app.get_app()
-            for _ in range(5):
-                await app.next_update_async()
-
-            new_payload = {"variant": "Lookout"}
-            _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-            new_event_type = carb.events.type_from_string("setBackdropVariant")
-            bus = omni.kit.app.get_app().get_message_bus_event_stream()
-            bus.push(new_event_type, sender=_sender_id, payload=new_payload)
-            app = omni.kit.app.get_app()
-            for _ in range(5):
-                await app.next_update_async()
-
-            new_payload = {"variant": "Edify"}
-            _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-            new_event_type = carb.events.type_from_string("setBackdropVariant")
-            bus = omni.kit.app.get_app().get_message_bus_event_stream()
-            bus.push(new_event_type, sender=_sender_id, payload=new_payload)
-            app = omni.kit.app.get_app()
-            for _ in range(5):
-                await app.next_update_async()
+            for variant in ("Lake_view", "Lookout", "Edify"):
+                self._bus.push(self._backdrop_event_type, sender=self._sender_id, payload={"variant": variant})
+                for _ in range(5):
+                    await self._app.next_update_async()
 
         return
 
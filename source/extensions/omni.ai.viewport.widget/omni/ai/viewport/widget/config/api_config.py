@@ -3,4 +3,7 @@ SHUTTERSTOCK_API_TOKEN = "v2/N0Q1UVM2RmNPbjZaSE9seXVydTR2NExZaEFmejZUV0svNDYwNTY
 
 # Other configuration constants
 MAX_ATTEMPTS = 10
-RETRY_DELAY = 5
\ No newline at end of file
+# Longest wait in seconds between two generation status polls, the first ones are shorter
+RETRY_DELAY = 5
+# Seconds a generation is polled for, the time MAX_ATTEMPTS polls RETRY_DELAY apart take
+GENERATION_TIMEOUT = MAX_ATTEMPTS * RETRY_DELAY
\ No newline at end of file
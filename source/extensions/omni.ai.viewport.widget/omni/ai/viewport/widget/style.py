@@ -11,12 +11,12 @@
 __all__ = ["get_extension_path", "get_style"]
 
 import functools
-import json
 import pathlib
 
 import carb.tokens
 import omni.kit.app
 import omni.ui as ui
+import orjson
 from omni.ui import color as cl
 from omni.ui import constant as fl
 from omni.ui import url
@@ -31,8 +31,7 @@ def get_extension_path():
 def get_style():
     # Read colors from JSON file
     json_path = get_extension_path() / "data" / "FigmaStyleTokens.json"
-    with open(json_path, "r") as f:
-        data = json.load(f)
+    data = orjson.loads(json_path.read_bytes())
 
     # Extract colors from the JSON data
     colors = data["themes"]["auto_extract"]["color"]["component"]
@@ -85,18 +84,19 @@ def get_style():
     fl.collapsable_header_font_size = 16
     fl.range_text_size = 10
 
-    url.closed_arrow_icon = f"{get_extension_path()}/data/icons/closed.svg"
-    url.open_arrow_icon = f"{get_extension_path()}/data/icons/opened.svg"
-    url.revert_arrow_icon = f"{get_extension_path()}/data/icons/revert_arrow.svg"
-    url.checkbox_on_icon = f"{get_extension_path()}/icons/checkbox_on.svg"
-    url.checkbox_off_icon = f"{get_extension_path()}/icons/checkbox_off.svg"
-    url.radio_btn_on_icon = f"{get_extension_path()}/icons/radio_btn_on.svg"
-    url.radio_btn_off_icon = f"{get_extension_path()}/icons/radio_btn_off.svg"
-    url.diag_bg_lines_texture = f"{get_extension_path()}/icons/diagonal_texture_screenshot.png"
-    url.combobox_arrow = f"{get_extension_path()}/data/ComboBox.svg"
+    ext_path = str(get_extension_path())
+    url.closed_arrow_icon = f"{ext_path}/data/icons/closed.svg"
+    url.open_arrow_icon = f"{ext_path}/data/icons/opened.svg"
+    url.revert_arrow_icon = f"{ext_path}/data/icons/revert_arrow.svg"
+    url.checkbox_on_icon = f"{ext_path}/icons/checkbox_on.svg"
+    url.checkbox_off_icon = f"{ext_path}/icons/checkbox_off.svg"
+    url.radio_btn_on_icon = f"{ext_path}/icons/radio_btn_on.svg"
+    url.radio_btn_off_icon = f"{ext_path}/icons/radio_btn_off.svg"
+    url.diag_bg_lines_texture = f"{ext_path}/icons/diagonal_texture_screenshot.png"
+    url.info_icon = f"{ext_path}/data/info.svg"
 
-    url.nvidia_font_regular = f"{get_extension_path()}/data/fonts/NVIDIASans_Rg.ttf"
-    url.nvidia_font_medium = f"{get_extension_path()}/data/fonts/NVIDIASans_Md.ttf"
+    url.nvidia_font_regular = f"{ext_path}/data/fonts/NVIDIASans_Rg.ttf"
+    url.nvidia_font_medium = f"{ext_path}/data/fonts/NVIDIASans_Md.ttf"
     fl.ai_texture_font_size = 15
     fl.ai_texture_panel_title_font_size = 20
 
@@ -133,18 +133,12 @@ def get_style():
             "secondary_background_color": cl.canva_background_pressed,
             "padding": 12,
             "margin": 3,
-            # "border_color": cl.red,
-        },
-        "ComboBox.Label": {
             "font": url.font_regular,
             "font_size": fl.canva_body_p4,
             "color": cl.canva_heading_font,
-            "margin": 12,
-        },
-        "ComboBox.Arrow": {
-            "image_url": url.combobox_arrow,
-            "color": cl.canva_heading_font,
-            "margin": 12,
+            # Background of the arrow
+            "secondary_color": cl.transparent,
+            # "border_color": cl.red,
         },
         "Button::PandoraCatalogFormInput": {
             "background_color": cl.transparent,
@@ -192,15 +186,11 @@ def get_style():
         "Separator": {
             "margin": 5,
         },
-        "Label::additional": {
-            "font_size": fl.canva_body_p6,
+        "Image::additional": {
+            "image_url": url.info_icon,
             "color": cl.revert_arrow_disabled,
             "margin": 4,
         },
-        "Circle::additional": {
-            "border_color": cl.revert_arrow_disabled,
-            "border_width": 1,
-        },
         "Tooltip": {
             "background_color": cl.canva_background_pressed,
             "border_radius": 30,
@@ -11,32 +11,48 @@
 __all__ = ["UpliftInputWindow"]
 
 import asyncio
-import base64
-import functools
 import io
-import pathlib
 import json
 
 import carb
 import carb.events
+import carb.settings
 import omni.kit.app
 import omni.kit.livestream.messaging as messaging
+import numpy as np
 import omni.ui as ui
 from omni.ai.viewport.core import AIViewportCoreExtension
 from omni.ai.viewport.core.abstract_uplift_model import AbstractUpliftModel
 from PIL import Image
+from pybase64 import b64encode
 
-from .style import get_style
+from .style import get_extension_path
+from .uplift_window_base import UpliftWindowBase
 from .widgets.uplift_canvas import UpliftCanvas
 from .widgets.uplift_parameters import UpliftParameterWidget
 
 
-@functools.lru_cache()
-def get_extension_path():
-    return pathlib.Path(omni.kit.app.get_app().get_extension_manager().get_extension_path_by_module(__name__))
-
-
-class UpliftInputWindow(ui.Window):
+# Size of an ImageTransferEvent message without its data, with the largest values of the other fields
+_METADATA_SIZE = len(
+    json.dumps(
+        {
+            "event_type": "ImageTransferEvent",
+            "payload": {
+                "width": 99999,
+                "height": 99999,
+                "part": 999,
+                "total_parts": 999,
+                "data": "",
+                "encoding": "base64",
+                "status": "success",
+            },
+        },
+        indent=2,
+    )
+)
+
+
+class UpliftInputWindow(UpliftWindowBase):
     def __init__(self, title: str, uplift_model: AbstractUpliftModel, ext, **kwargs):
         super().__init__(title, **kwargs)
 
@@ -47,20 +63,20 @@ class UpliftInputWindow(ui.Window):
         # Hold the uplift canvas
         self._uplift_canvas = None
         self._ext = ext
-        self._uplift_model = None
         # set the uplift model and do the init
         self.set_uplift_model(uplift_model)
 
         # Auto update the viewport
         self._auto_update_model = ui.SimpleBoolModel(False)
 
-        self._mode_context_menu = ui.Menu()
-
-        # Apply the style to all the widgets of this window
-        self.frame.style = get_style()
+        # Register the custom event type sent to the web frontend once, not on every image
+        messaging.register_event_type_to_send("ImageTransferEvent")
+        self._message_bus = omni.kit.app.get_app().get_message_bus_event_stream()
+        self._event_type = carb.events.type_from_string("ImageTransferEvent")
 
-        # Set the function that is called to build widgets when the window is
-        self.frame.set_build_fn(self._build_fn)
+        # Every part is a dispatch and a JSON serialization, larger parts are opt-in through the setting
+        settings = carb.settings.get_settings()
+        self._max_message_size = settings.get("/exts/omni.ai.viewport.widget/max_message_size") or 65535
 
     def destroy(self):
         # if self._uplift_canvas:
@@ -71,10 +87,6 @@ class UpliftInputWindow(ui.Window):
             self._uplift_parameter_widget.destroy()
             self._uplift_parameter_widget = None
 
-        if self._uplift_model:
-            # self._uplift_model.destroy()
-            self._uplift_model = None
-
         if self._viewport_buffers_capture:
             self._viewport_buffers_capture = None
 
@@ -89,59 +101,33 @@ class UpliftInputWindow(ui.Window):
         self._uplift_canvas = canvas
 
     def set_uplift_model(self, uplift_model: AbstractUpliftModel):
-        # The Model/API that generate the Uplift version of the Viewport
-        self._uplift_model = uplift_model
+        super().set_uplift_model(uplift_model)
 
         # Make sure we are using the right buffers
         self._setup_viewport_buffers()
 
     def _setup_viewport_buffers(self):
         """Set the viewport buffer with all the required buffer"""
-        required_buffer = []
-        required_capture_types = []
-        params = self._uplift_model.get_parameters_spec()
-        for param in params:
-            if param["type"] == "image":
-                buffer_name = param["buffer_name"]
-                if buffer_name in self._viewport_buffers_capture.supported_buffer_types:
-                    control_name = param["control_name"]
-                    asset_path = param["asset_path"]
-                    if "visibility" in param:
-                        visibility = param["visibility"]
-                    else:
-                        visibility = "showall"
-                    required_buffer.append(buffer_name)
-                    required_capture_types.append([buffer_name, control_name, asset_path, visibility])
-                else:
-                    carb.log_error(f"'{buffer_name} is not supported")
+        supported = set(self._viewport_buffers_capture.supported_buffer_types)
+        image_params = [param for param in self._uplift_model.get_parameters_spec() if param["type"] == "image"]
+        for param in image_params:
+            if param["buffer_name"] not in supported:
+                carb.log_error(f"'{param['buffer_name']} is not supported")
+
+        required_capture_types = [
+            [param["buffer_name"], param["control_name"], param["asset_path"], param.get("visibility", "showall")]
+            for param in image_params
+            if param["buffer_name"] in supported
+        ]
+        required_buffer = [capture_type[0] for capture_type in required_capture_types]
 
         self._viewport_buffers_capture.set_active_buffer_types(required_buffer)
         self._viewport_buffers_capture.set_active_capture_types(required_capture_types)
 
     def _set_mode(self, mode: str):
-        self._uplift_model.set_mode(mode)
-
-        # Rebuild the connection
-        self.set_uplift_model(self._uplift_model)
+        super()._set_mode(mode)
         self._uplift_parameter_widget.set_uplift_model(self._uplift_model)
 
-    def _show_mode_context_menu(self, x, y, button, modifier):
-        """The context menu to copy the text"""
-        # Display context menu only if the right button is pressed
-        if button != 1:
-            return
-
-        # Reset the previous context popup
-        self._mode_context_menu.clear()
-        modes = self._uplift_model.get_available_mode()
-
-        with self._mode_context_menu:
-            for mode in modes:
-                ui.MenuItem(mode, triggered_fn=lambda mode=mode: self._set_mode(mode))
-
-        # Show it
-        self._mode_context_menu.show()
-
     def _build_fn(self):
         with ui.VStack(spacing=5) as stack:
             self._progress_bar = ui.ProgressBar(height=10, visible=False)
@@ -173,11 +159,16 @@ class UpliftInputWindow(ui.Window):
             uplifted_image, size = await self._uplift_model.generate(progress_model)
 
             self._progress_bar.visible = False
+            if uplifted_image is None:
+                # Already logged by the model
+                return
             # update the viewport with the new image
             # self._uplift_canvas.update_image(uplifted_image, size)
             self._ext._output_window._uplift_canvas.update_image(uplifted_image, size)
 
-            self._send_image(size[0], size[1], uplifted_image)
+            # Decode, resize and encode in a thread, only the dispatch needs the loop
+            chunks = await asyncio.to_thread(self._prepare_chunks, size[0], size[1], uplifted_image)
+            self._dispatch_chunks(chunks)
 
             # Check if auto-update is enabled and queue the next generation if it is
             if self._auto_update_model.as_bool:
@@ -198,15 +189,18 @@ class UpliftInputWindow(ui.Window):
         with Image.open(image_path) as img:
             width, height = img.size
             img_data = img.tobytes()
-            self._send_image(width, height, img_data)
+            self._send_image(width, height, img_data, channels=len(img.getbands()))
 
-    def _send_image(self, width, height, data, max_size=None, max_message_size=65535):
-        # Register custom event type
-        messaging.register_event_type_to_send("ImageTransferEvent")
+    def _send_image(self, width, height, data, channels=4, max_size=None, max_message_size=None):
+        self._dispatch_chunks(self._prepare_chunks(width, height, data, channels, max_size, max_message_size))
 
-        message_bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        event_type = carb.events.type_from_string("ImageTransferEvent")
+    def _prepare_chunks(self, width, height, data, channels=4, max_size=None, max_message_size=None):
+        """
+        Convert the RGB or RGBA image to the payload and the base64 parts of the ImageTransferEvent messages, or None
+        when the data can't be read. Doesn't touch the UI so it can run in a thread.
+        """
         event_status = "success"
+        max_message_size = max_message_size or self._max_message_size
 
         print(
             f"Received image data: width={width}, height={height}, data type={type(data)}, data length={len(data) if isinstance(data, (list, bytes)) else 'N/A'}"
@@ -214,80 +208,99 @@ class UpliftInputWindow(ui.Window):
 
         # Convert list of tuples to bytes if necessary
         if isinstance(data, list):
-            data = b"".join(bytes(pixel) for pixel in data)
+            if data and isinstance(data[0], int):
+                data = bytes(data)
+            else:
+                # Converted in C by numpy instead of walking the tuples in Python
+                data = np.asarray(data, dtype=np.uint8).tobytes()
         elif not isinstance(data, bytes):
             raise ValueError("data must be either bytes or a list of RGB/RGBA tuples")
 
-        # Determine if the image is RGB or RGBA
-        channels = 3 if len(data) == width * height * 3 else 4
-        mode = "RGB" if channels == 3 else "RGBA"
-
-        # Create an image from the data
-        try:
-            img = Image.frombytes(mode, (width, height), data)
-        except ValueError as e:
-            print(f"Error creating image: {e}")
-            print(f"Expected data length: {width * height * channels}, Actual data length: {len(data)}")
-            return
+        mode = "RGBA" if channels == 4 else "RGB"
 
-        if not img.getbbox():
+        # Same as PIL getbbox() without decoding the image, an RGBA image is empty when it is fully transparent and an
+        # RGB one when it is black
+        pixels = np.frombuffer(data, dtype=np.uint8)
+        if not (pixels[3::4] if channels == 4 else pixels).any():
             event_status = "error"
 
-        # Convert to RGBA if it's not already
-        if img.mode != "RGBA":
-            img = img.convert("RGBA")
-
-        # Resize the image if max_size is set
-        if max_size:
-            # Calculate the scaling factor
-            scale = min(max_size / width, max_size / height)
-            if scale < 1:
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-                print(f"Resized image to: {new_width}x{new_height}")
-
-        # Convert the image to raw RGBA bytes
-        img_bytes = img.tobytes()
-
-        print(f"Sending image data: width={img.width}, height={img.height}, data length={len(img_bytes)}")
-
-        # Estimate metadata size
-        metadata_size = len(
-            json.dumps(
-                {
-                    "event_type": "ImageTransferEvent",
-                    "payload": {"width": img.width, "height": img.height, "part": 999, "total_parts": 999, "data": "", "status": event_status},
-                },
-                indent=2,
-            )
-        )
-
-        # Calculate the maximum data size per chunk
-        max_data_size = (max_message_size - metadata_size) // 2
+        if channels == 4 and not max_size:
+            # Already what is sent, no need to go through PIL
+            if len(data) != width * height * channels:
+                print(f"Expected data length: {width * height * channels}, Actual data length: {len(data)}")
+                return None
+
+            img_bytes = data
+            img_width, img_height = width, height
+        else:
+            # Create an image from the data
+            try:
+                img = Image.frombytes(mode, (width, height), data)
+            except ValueError as e:
+                print(f"Error creating image: {e}")
+                print(f"Expected data length: {width * height * channels}, Actual data length: {len(data)}")
+                return None
+
+            # Resize the image if max_size is set
+            if max_size:
+                # Calculate the scaling factor
+                scale = min(max_size / width, max_size / height)
+                if scale < 1:
+                    new_width = int(width * scale)
+                    new_height = int(height * scale)
+                    # Only a preview for the frontend, bilinear after a box reduction like thumbnail() is much
+                    # cheaper than LANCZOS and looks the same at this size
+                    img = img.resize((new_width, new_height), Image.BILINEAR, reducing_gap=2.0)
+                    print(f"Resized image to: {new_width}x{new_height}")
+
+            # RGBA is sent, converted after the resize so RGB images resize a quarter less data
+            if channels != 4:
+                img = img.convert("RGBA")
+
+            # Convert the image to raw RGBA bytes
+            img_bytes = img.tobytes()
+            img_width, img_height = img.size
+
+        print(f"Sending image data: width={img_width}, height={img_height}, data length={len(img_bytes)}")
+
+        # Calculate the maximum data size per chunk, base64 is 4 chars per 3 bytes so keep it a multiple of 3 to
+        # not pad the chunks
+        max_data_size = (max_message_size - _METADATA_SIZE) * 3 // 4 // 3 * 3
 
         # Calculate the number of parts
         total_parts = -(-len(img_bytes) // max_data_size)  # Ceiling division
 
-        for part in range(total_parts):
-            start = part * max_data_size
-            end = min((part + 1) * max_data_size, len(img_bytes))
-            chunk = img_bytes[start:end]
-
-            # Encode the chunk as a hex string
-            encoded_chunk = chunk.hex()
+        payload = {
+            "width": img_width,
+            "height": img_height,
+            "part": 0,
+            "total_parts": total_parts,
+            "data": "",
+            "encoding": "base64",
+            "status": event_status,
+        }
+
+        # Slice without copying, the chunks are only read by the encoder. Encoded as base64, a third smaller than hex
+        img_view = memoryview(img_bytes)
+        parts = [
+            b64encode(img_view[start : start + max_data_size]).decode("ascii")
+            for start in range(0, len(img_bytes), max_data_size)
+        ]
+
+        return payload, parts
+
+    def _dispatch_chunks(self, chunks):
+        """Send the parts made by _prepare_chunks to the web frontend"""
+        if chunks is None:
+            return
 
-            # Prepare the payload
-            payload = {
-                "width": img.width,
-                "height": img.height,
-                "part": part,
-                "total_parts": total_parts,
-                "data": encoded_chunk,
-                "status": event_status,
-            }
+        # dispatch copies the payload into a carb dictionary, so the same dict is reused for every part
+        payload, parts = chunks
+        for part, data in enumerate(parts):
+            payload["part"] = part
+            payload["data"] = data
 
             # Dispatch the event
-            message_bus.dispatch(event_type, payload=payload)
+            self._message_bus.dispatch(self._event_type, payload=payload)
 
-        print(f"Sent image in {total_parts} parts")
+        print(f"Sent image in {len(parts)} parts")
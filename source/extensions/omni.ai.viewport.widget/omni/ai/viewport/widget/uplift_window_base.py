@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: LicenseRef-NvidiaProprietary
+#
+# NVIDIA CORPORATION, its affiliates and licensors retain all intellectual
+# property and proprietary rights in and to this material, related
+# documentation and any modifications thereto. Any use, reproduction,
+# disclosure or distribution of this material and related documentation
+# without an express license agreement from NVIDIA CORPORATION or
+# its affiliates is strictly prohibited.
+
+
+__all__ = ["UpliftWindowBase"]
+
+import functools
+
+import omni.ui as ui
+from omni.ai.viewport.core.abstract_uplift_model import AbstractUpliftModel
+
+from .style import get_style
+
+
+class UpliftWindowBase(ui.Window):
+    """The part shared by the input and output windows: the style, the model and the mode context menu"""
+
+    def __init__(self, title: str, **kwargs):
+        super().__init__(title, **kwargs)
+
+        # The Model/API that generate the Uplift version of the Viewport
+        self._uplift_model = None
+
+        self._mode_context_menu = ui.Menu()
+
+        # Apply the style to all the widgets of this window
+        self.frame.style = get_style()
+
+        # Set the function that is called to build widgets when the window is
+        self.frame.set_build_fn(self._build_fn)
+
+    def destroy(self):
+        if self._uplift_model:
+            # self._uplift_model.destroy()
+            self._uplift_model = None
+
+        super().destroy()
+
+    def set_uplift_model(self, uplift_model: AbstractUpliftModel):
+        # The Model/API that generate the Uplift version of the Viewport
+        self._uplift_model = uplift_model
+
+    def _set_mode(self, mode: str):
+        self._uplift_model.set_mode(mode)
+
+        # Rebuild the connection
+        self.set_uplift_model(self._uplift_model)
+
+    def _show_mode_context_menu(self, x, y, button, modifier):
+        """The context menu to copy the text"""
+        # Display context menu only if the right button is pressed
+        if button != 1:
+            return
+
+        # Reset the previous context popup
+        self._mode_context_menu.clear()
+        modes = self._uplift_model.get_available_mode()
+
+        with self._mode_context_menu:
+            for mode in modes:
+                ui.MenuItem(mode, triggered_fn=functools.partial(self._set_mode, mode))
+
+        # Show it
+        self._mode_context_menu.show()
+
+    def _build_fn(self):
+        pass
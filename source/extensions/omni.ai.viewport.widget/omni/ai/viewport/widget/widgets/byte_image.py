@@ -10,18 +10,13 @@
 
 __all__ = ["ByteImage"]
 
-import functools
-import pathlib
 from typing import List, Tuple
 
 import carb.settings
-import omni.kit.app
+import numpy as np
 import omni.ui as ui
 
-
-@functools.lru_cache()
-def get_extension_path():
-    return pathlib.Path(omni.kit.app.get_app().get_extension_manager().get_extension_path_by_module(__name__))
+from ..style import get_extension_path
 
 
 class ByteImage:
@@ -32,10 +27,11 @@ class ByteImage:
         # The content of the viewport
         self._byte_provider = None
 
-        # Preview image
+        # Preview image, only loaded when it's shown and released with the first real image
         settings = carb.settings.get_settings()
         preview = settings.get("/exts/omni.ai.viewport.widget/preview_image") or "coffee_machine_0.png"
-        self._preview_provider = ui.RasterImageProvider(f"{get_extension_path()}/data/{preview}")
+        self._preview_path = f"{get_extension_path()}/data/{preview}"
+        self._preview_provider = None
 
         # We build the frame of the viewport
         self._frame = ui.Frame(width=512, height=512)
@@ -56,6 +52,8 @@ class ByteImage:
         return (self._image_with_provider.width.value, self._image_with_provider.height.value)
 
     def _build_fn(self):
+        if self._byte_provider is None and self._preview_provider is None:
+            self._preview_provider = ui.RasterImageProvider(self._preview_path)
         provider = self._byte_provider or self._preview_provider
         self._image_with_provider = ui.ImageWithProvider(
             provider,
@@ -69,15 +67,23 @@ class ByteImage:
         )
 
     # update the image
-    def update_image(self, pixels: List[int], size: List[int]):
-        """Update the image with new pixel data and size."""
+    def update_image(self, pixels: bytes, size: List[int]):
+        """Update the image with new RGBA pixel data (bytes, bytearray or memoryview) and size."""
         if not self._byte_provider:
             self._byte_provider = ui.ByteImageProvider()
 
             with self._frame:
                 self._build_fn()
 
+            if self._preview_provider:
+                self._preview_provider.destroy()
+                self._preview_provider = None
+
         if pixels:
             self._image_with_provider.width = ui.Pixel(size[0])
             self._image_with_provider.height = ui.Pixel(size[1])
-            self._byte_provider.set_bytes_data(pixels, size)
+            if isinstance(pixels, list):
+                # Legacy callers, converted once so the provider always gets a buffer it can copy in one go
+                pixels = bytes(pixels)
+            array = np.frombuffer(pixels, dtype=np.uint8).reshape(size[1], size[0], 4)
+            self._byte_provider.set_data_array(array, size)
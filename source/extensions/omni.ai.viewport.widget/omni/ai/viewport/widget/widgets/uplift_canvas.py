@@ -10,8 +10,10 @@
 
 __all__ = ["UpliftCanvas"]
 
+import asyncio
 from typing import List
 
+import omni.kit.app
 import omni.ui as ui
 from carb.input import KeyboardInput as Key
 
@@ -27,6 +29,14 @@ class UpliftCanvas:
                 self._image = ByteImage()
         self._canvas.set_key_pressed_fn(self._on_key_pressed)
 
+        # Sizes used by fit_image, measured once and dropped when the frame is resized or the image changes
+        self._cached_frame_size = None
+        self._cached_image_size = None
+        self._frame.set_computed_content_size_changed_fn(self._on_resize)
+
+        # At most one fit per UI frame, however many images arrive during it
+        self._fit_pending = False
+
     def destroy(self):
         self._canvas.destroy()
         self._canvas = None
@@ -42,9 +52,27 @@ class UpliftCanvas:
         if key == Key.R:
             self.reset_image()
 
-    def update_image(self, pixels: List[int], size: List[int]):
+    def _on_resize(self):
+        self._cached_frame_size = None
+
+    def update_image(self, pixels: bytes, size: List[int]):
         if pixels:
             self._image.update_image(pixels, size)
+
+            # Same size as the fitted image in a frame that wasn't resized since, the zoom and pan are still right
+            image_size = (size[0], size[1])
+            if image_size == self._cached_image_size and self._cached_frame_size is not None:
+                return
+            self._cached_image_size = image_size
+
+            if not self._fit_pending:
+                self._fit_pending = True
+                asyncio.ensure_future(self._deferred_fit())
+
+    async def _deferred_fit(self):
+        await omni.kit.app.get_app().next_update_async()
+        self._fit_pending = False
+        if self._canvas:
             self.fit_image()
 
     def reset_image(self):
@@ -55,24 +83,28 @@ class UpliftCanvas:
         self._canvas.zoom = 1
 
     def fit_image(self):
-        image_size = self._image.get_size()
-        frame_size = (self._frame.computed_width, self._frame.computed_height)
-        fit_zoom = min(frame_size[0] / image_size[0], frame_size[1] / image_size[1])
+        if self._cached_image_size is None:
+            self._cached_image_size = self._image.get_size()
+        if self._cached_frame_size is None:
+            self._cached_frame_size = (self._frame.computed_width, self._frame.computed_height)
+        image_size = self._cached_image_size
+        frame_size = self._cached_frame_size
+
+        # No image yet or the frame isn't laid out, nothing to fit. Both are measured again on the next fit, and the
+        # next image is fitted even when it has the same size
+        if not (image_size[0] and image_size[1] and frame_size[0] and frame_size[1]):
+            self._cached_image_size = None
+            self._cached_frame_size = None
+            return
 
-        print(f"Image size: {image_size}")
-        print(f"Frame size: {frame_size}")
-        print(f"Calculated fit zoom: {fit_zoom}")
+        fit_zoom = min(frame_size[0] / image_size[0], frame_size[1] / image_size[1])
 
         # Calculate the centered position
         centered_x = (frame_size[0] - image_size[0] * fit_zoom) / 4 / fit_zoom
         centered_y = (frame_size[1] - image_size[1] * fit_zoom) / 4 / fit_zoom
 
-        print(f"Centered position: x = {centered_x}, y = {centered_y}")
-
         # Apply zoom and centering
         self._canvas.zoom = fit_zoom
         self._canvas.pan_x = centered_x
         self._canvas.pan_y = 0 # centered_y
 
-        print(f"Applied zoom: {self._canvas.zoom}")
-        print(f"Applied pan: x = {self._canvas.pan_x}, y = {self._canvas.pan_y}")
@@ -11,22 +11,47 @@
 __all__ = ["UpliftParameterWidget"]
 
 
-from urllib import request, error
 import asyncio
+import functools
 import os
-import json
+
+import aiohttp
 import carb
 import carb.events
-import carb.tokens
-import omni.ext
 import omni.kit.app
 import omni.ui as ui
 from omni.ai.viewport.core.abstract_uplift_model import AbstractUpliftModel
 from omni.ui import color as cl
 import omni.usd
-from pxr import Sdf, Usd, UsdGeom, UsdShade
-from ..config.api_config import SHUTTERSTOCK_API_TOKEN, MAX_ATTEMPTS, RETRY_DELAY
+from ..config.api_config import SHUTTERSTOCK_API_TOKEN, GENERATION_TIMEOUT, RETRY_DELAY
+from ..style import get_style
+
+# Variant names per combo box item, in the order of the items
+DISPLAY_VARIANTS = ("Display1", "Display2")
+CUP_VARIANTS = ("Glass_Mug", "Espresso_Cup", "Coffee_Mug")
+MACHINE_VARIANTS = ("Black", "Blue", "Cream", "Olive")
+ENV_VARIANTS = ("Lake_view", "Lookout", "Edify", "None")
+
+VARIANT_EVENTS = ("setDisplayVariant", "setCupVariant", "setColorVariant", "setBackdropVariant")
+
+# Shared by every widget that uses them, omni.ui copies the style so they are never modified
+_SEPARATOR_STYLE = {"background_color": cl.transparent}
+_TRANSPARENT_BUTTON_STYLE = {"background_color": cl.transparent}
+
+
+def _param_key(param) -> tuple:
+    """What the widgets of a parameter are built from, a parameter with the same key can keep its widgets"""
+    return (param["type"], param["control_name"], param["default_value"], param.get("description"))
+
+
+def _separator_margin():
+    """The margin of the Separator style, on each side of a separator"""
+    return get_style()["Separator"]["margin"]
+
 
+def _variant(variants, index: int) -> str:
+    """The variant of the combo box item, or the first one when the index is out of range"""
+    return variants[index] if 0 <= index < len(variants) else variants[0]
 
 
 class ExpandablePrompt:
@@ -40,9 +65,13 @@ class ExpandablePrompt:
         """
         self._state = True  # True: Collapsed, False: Expand
         self._text_model = text_model
-        self._frame = ui.Frame(build_fn=self._build_fn)
 
-    def _build_fn(self):
+        # Built once, _toggle updates the widgets in place so the frame never needs a build_fn
+        self._frame = ui.Frame()
+        with self._frame:
+            self._build()
+
+    def _build(self):
         """Build the UI components of the expandable prompt."""
         with ui.ZStack(height=0):
             self._text_field = ui.StringField(
@@ -61,7 +90,12 @@ class ExpandablePrompt:
     def _toggle(self):
         """Toggle the expanded/collapsed state of the prompt."""
         self._state = not self._state
-        self._frame.rebuild()
+
+        # Only the field height and mode and the button text change, so the widgets are updated instead of rebuilt
+        # and the field keeps its focus and selection
+        self._text_field.height = ui.Pixel(25 if self._state else 80)
+        self._text_field.multiline = not self._state
+        self._expand_button.text = "+" if self._state else "-"
 
 
 class Label:
@@ -73,36 +107,8 @@ class Label:
 class ComboBox:
     def __init__(self, *args, **kwargs):
         name = kwargs.pop("name", "PandoraCatalogSelect")
-        with ui.ZStack():
-            ui.Rectangle(style_type_name_override="ComboBox", name=name)
-            self.__combo = ui.ComboBox(
-                *args,
-                **kwargs,
-                name=name,
-                style={
-                    "background_color": cl.transparent,
-                    "border_color": cl.transparent,
-                    "secondary_color": cl.transparent,
-                    "color": cl.transparent,
-                },
-            )
-
-            with ui.HStack():
-                label = ui.Label(
-                    "",
-                    style_type_name_override="ComboBox.Label",
-                    name=name,
-                )
-                ui.Image(width=35, style_type_name_override="ComboBox.Arrow", name=name)
-
-            def set_text(label, model):
-                n = model.get_item_value_model().get_value_as_int()
-                item = model.get_item_children()[n]
-                text = model.get_item_value_model(item).as_string
-                label.text = text
-
-            set_text(label, self.__combo.model)
-            self.__combo.model.add_item_changed_fn(lambda m, i, l=label: set_text(l, m))
+        # The native combo box draws its text and arrow, the look is in the ComboBox style
+        self.__combo = ui.ComboBox(*args, **kwargs, name=name)
 
     @property
     def model(self):
@@ -112,7 +118,7 @@ class ComboBox:
 class Separator:
     def __init__(self, **kwargs):
         style_type_name_override = kwargs.pop("style_type_name_override", "Separator")
-        style = kwargs.pop("style", {"background_color": cl.transparent})
+        style = kwargs.pop("style", _SEPARATOR_STYLE)
         ui.Spacer(width=0, height=0, style_type_name_override=style_type_name_override, style=style, **kwargs)
 
 
@@ -126,18 +132,17 @@ class Info:
         self.__tooltip_hint = tooltip_hint
         self.__tooltip = tooltip
 
-        # TODO: Add the correct icon, this is "\u24D8"
-        with ui.ZStack(tooltip_fn=lambda: self._tooltip_fn()):
-            ui.Circle(name=self.__name)
-            ui.Label("i", **kwargs, name=self.__name)
+        # The "i" in a circle, one image instead of a Circle and a Label in a ZStack
+        ui.Image(width=16, height=16, tooltip_fn=self._tooltip_fn, **kwargs, name=self.__name)
 
     def _tooltip_fn(self):
-        with ui.VStack(width=0, height=0):
-            with ui.HStack():
+        # Called on every hover, omni.ui doesn't keep the tooltip widgets. The stack spacing is the space of a
+        # Separator (its margin on both sides), so only the labels are built
+        spacing = _separator_margin() * 2
+        with ui.VStack(width=0, height=0, spacing=spacing):
+            with ui.HStack(spacing=spacing):
                 ui.Label(self.__tooltip_heading, name="tooltipHeading", width=0)
-                Separator()
                 ui.Label(self.__tooltip_hint, name="tooltipHint", width=0)
-            Separator()
             ui.Label(self.__tooltip, name="tooltip")
 
 
@@ -146,18 +151,17 @@ class RoundButton:
         name = kwargs.pop("name", "PandoraCatalogButton")
 
         with ui.ZStack(width=0, height=0):
-            with ui.HStack():
-                Separator()
-                Separator()
-                with ui.ZStack():
-                    with ui.ZStack():
-                        ui.Circle(style_type_name_override="Button", name=name, alignment=ui.Alignment.LEFT_CENTER)
-                        ui.Circle(style_type_name_override="Button", name=name, alignment=ui.Alignment.RIGHT_CENTER)
-                        ui.Rectangle(style_type_name_override="Button", name=name, style={"border_radius": 0})
-                Separator()
-                Separator()
+            # The pill, rounded by the border_radius of the Button::PandoraCatalogButton style
+            ui.Rectangle(style_type_name_override="Button", name=name)
+            ui.Button(text, name=name, style=_TRANSPARENT_BUTTON_STYLE, **kwargs)
 
-            ui.Button(text, name=name, style={"background_color": ui.color.transparent}, **kwargs)
+
+def _param_header(text, tooltip, tooltip_heading="Heading", **kwargs):
+    """The label of a parameter followed by its info icon, kwargs go to the Label"""
+    with ui.HStack(width=0):
+        Label(text, **kwargs)
+        Separator()
+        Info(tooltip_heading=tooltip_heading, tooltip=tooltip)
 
 
 class UpliftParameterWidget:
@@ -169,9 +173,33 @@ class UpliftParameterWidget:
     ):
         self._auto_update_model = auto_update_model
         self._uplift_model = uplift_model
+        # The spec only changes with the model or its mode, which both go through set_uplift_model
+        self._params = uplift_model.get_parameters_spec()
+        self._params_by_name = {param["name"]: param for param in self._params}
         self._uplift_cb = uplift_cb
+
+        # The parameters are built in their own frame each, keyed by name, so a new model only rebuilds the ones
+        # that changed
+        self._params_stack = None
+        self._param_frames = {}
+        # name -> (type, default value, value model, value changed callback), kept across rebuilds so the edits are
+        # not lost
+        self._param_models = {}
+
         self._frame = ui.Frame(build_fn=self._build_fn, height=0)
-        self._tasks = []  # Keep track of running tasks
+        self._tasks = set()  # Keep track of running tasks
+        # (model, subscription id) of the combo box callbacks, they hold self and are removed on destroy
+        self._combo_subscriptions = []
+        # Set while a Shutterstock request runs, a second click doesn't start another one
+        self._in_flight = False
+
+        # The variants are pushed on the message bus, the sender and event types are looked up once
+        self._bus = omni.kit.app.get_app().get_message_bus_event_stream()
+        self._sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
+        self._event_types = {name: carb.events.type_from_string(name) for name in VARIANT_EVENTS}
+        # event name -> variant waiting for the next update, see _push_variant
+        self._pending_variants = {}
+        self._flush_task = None
 
     def destroy(self):
         """Clean up resources when the widget is destroyed."""
@@ -180,104 +208,119 @@ class UpliftParameterWidget:
             task.cancel()
         self._tasks.clear()
 
+        # Drop the callbacks bound to self, so the widget and the model are freed without waiting for the GC
+        for model, subscription in self._combo_subscriptions:
+            model.remove_item_changed_fn(subscription)
+        self._combo_subscriptions.clear()
+
         # Destroy the frame
         if self._frame:
             self._frame.destroy()
             self._frame = None
+        self._params_stack = None
+        self._param_frames = {}
+        self._param_models = {}
+
+        self._uplift_model = None
+        self._uplift_cb = None
+        self._auto_update_model = None
+        self._string_model = None
+        self._run_button = None
 
     def set_uplift_model(self, uplift_model: AbstractUpliftModel):
+        old_keys = {param["name"]: _param_key(param) for param in self._params}
+
         self._uplift_model = uplift_model
-        # Trigger a rebuild of the content
-        self._frame.rebuild()
+        self._params = uplift_model.get_parameters_spec()
+        self._params_by_name = {param["name"]: param for param in self._params}
+
+        # The edits of the parameters that are still there with the same type and default carry over to the new
+        # model, a new default replaces the value so the workflow gets its own default
+        for name, (param_type, default_value, param_model, callback) in list(self._param_models.items()):
+            param = self._params_by_name.get(name)
+            if param is None or param["type"] != param_type or param["default_value"] != default_value:
+                del self._param_models[name]
+            else:
+                callback(param_model)
+
+        if self._params_stack is None:
+            # Not built yet, _build_fn reads the new spec when the frame is built
+            return
+
+        new_keys = {param["name"]: _param_key(param) for param in self._params}
+        if list(new_keys.items()) == list(old_keys.items()):
+            # Same spec, typically a mode switch of the same model, the widgets are already right
+            return
+
+        names = [param["name"] for param in self._params]
+        kept = [name for name in old_keys if name in self._params_by_name]
+        if names[: len(kept)] != kept:
+            # Reordered, or new parameters between the kept ones
+            self._rebuild_params()
+            return
+
+        for name in old_keys.keys() - self._params_by_name.keys():
+            self._param_frames.pop(name).destroy()
+
+        for param in self._params:
+            name = param["name"]
+            if name not in old_keys:
+                with self._params_stack:
+                    self._add_param_frame(param)
+            elif _param_key(param) != old_keys[name]:
+                self._param_frames[name].rebuild()
+
+    def _push_variant(self, event_name: str, variant: str):
+        """
+        Queue the variant, the events are pushed at the next update with the last variant of each one so several
+        changes in the same frame trigger a single variant switch per event
+        """
+        self._pending_variants[event_name] = variant
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_variants())
+            self._tasks.add(self._flush_task)
+            self._flush_task.add_done_callback(self._tasks.discard)
+
+    async def _flush_variants(self):
+        await omni.kit.app.get_app().next_update_async()
+
+        pending, self._pending_variants = self._pending_variants, {}
+        self._flush_task = None
+        for event_name, variant in pending.items():
+            try:
+                self._bus.push(self._event_types[event_name], sender=self._sender_id, payload={"variant": variant})
+                carb.log_verbose(f"Event sent: {event_name} with variant '{variant}'")
+            except Exception as e:
+                carb.log_error(f"Error sending {event_name} event: {str(e)}")
 
     def change_display(self, combo_model, _):
         v = combo_model.get_item_value_model().get_value_as_int()
-        new_payload = {"variant": "Display1"}
-        if v == 1:
-            new_payload["variant"] = "Display2"
-
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setDisplayVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload=new_payload)
+        self._push_variant("setDisplayVariant", _variant(DISPLAY_VARIANTS, v))
 
     def change_cup(self, combo_model, _):
         v = combo_model.get_item_value_model().get_value_as_int()
-        new_payload = {"variant": "Glass_Mug"}
-        if v == 1:
-            new_payload["variant"] = "Espresso_Cup"
-        elif v == 2:
-            new_payload["variant"] = "Coffee_Mug"
-
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setCupVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload=new_payload)
+        self._push_variant("setCupVariant", _variant(CUP_VARIANTS, v))
 
     def change_machine(self, combo_model, _):
         v = combo_model.get_item_value_model().get_value_as_int()
-        new_payload = {"variant": "Black"}
-        if v == 1:
-            new_payload["variant"] = "Blue"
-        elif v == 2:
-            new_payload["variant"] = "Cream"
-        elif v == 3:
-            new_payload["variant"] = "Olive"
-
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setColorVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload=new_payload)
+        self._push_variant("setColorVariant", _variant(MACHINE_VARIANTS, v))
 
     def change_env(self, combo_model, _):
         """Change the environment variant based on combo box selection."""
         v = combo_model.get_item_value_model().get_value_as_int()
-        new_payload = {"variant": "Lake_view"}  # Default variant
-
-        # Map index to variant name
-        variant_map = {
-            0: "Lake_view",
-            1: "Lookout",
-            2: "Edify",
-            3: "None"
-        }
-
-        if v in variant_map:
-            new_payload["variant"] = variant_map[v]
-
-        # print(f"\nChanging environment variant:")
-        # print(f"Selected index: {v}")
-        # print(f"Sending payload: {new_payload}")
-
-        try:
-            _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-            new_event_type = carb.events.type_from_string("setBackdropVariant")
-            bus = omni.kit.app.get_app().get_message_bus_event_stream()
-            bus.push(new_event_type, sender=_sender_id, payload=new_payload)
-            print(f"✓ Event sent: setBackdropVariant with variant '{new_payload['variant']}'")
-        except Exception as e:
-            print(f"❌ Error sending backdrop variant event: {str(e)}")
+        self._push_variant("setBackdropVariant", _variant(ENV_VARIANTS, v))
 
     def switch_to_edify(self):
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setBackdropVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload={"variant": "Edify"})
-        print("✓ Switched to Edify variant")
+        self._push_variant("setBackdropVariant", "Edify")
+        carb.log_verbose("Switched to Edify variant")
 
-    def check_generation_status(self, generation_id):
+    async def check_generation_status(self, session: aiohttp.ClientSession, generation_id):
         """Check the status of a generation request and return panorama URL if ready."""
-        api_token = SHUTTERSTOCK_API_TOKEN
         url = f"https://api.shutterstock.com/v2/ai-generated/{generation_id}"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_token}"
-        }
 
         try:
-            req = request.Request(url, headers=headers, method='GET')
-            with request.urlopen(req) as response:
-                response_data = json.loads(response.read().decode('utf-8'))
+            async with session.get(url) as response:
+                response_data = await response.json(content_type=None)
 
                 if response_data.get("status") == "completed":
                     # Look for panorama URL in output
@@ -316,58 +359,80 @@ class UpliftParameterWidget:
         try:
             os.makedirs(target_dir, exist_ok=True)
 
-            req = request.Request(
-                "https://api.shutterstock.com/v2/ai-generated/text-to-panorama",
-                data=json.dumps(data).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
+            # One session for the submit and the polling, none of them blocks the UI
+            async with aiohttp.ClientSession(headers=headers) as session:
+                async with session.post(
+                    "https://api.shutterstock.com/v2/ai-generated/text-to-panorama", json=data
+                ) as response:
+                    response_data = await response.json(content_type=None)
+                    generation_id = response_data.get("id")
+                    if not generation_id:
+                        return
 
-            with request.urlopen(req) as response:
-                response_data = json.loads(response.read().decode('utf-8'))
-                generation_id = response_data.get("id")
-                if not generation_id:
-                    return
-
-            for attempt in range(MAX_ATTEMPTS):
-                print(f"Still generating... waiting {RETRY_DELAY} seconds")
-                panorama_url = self.check_generation_status(generation_id)
-
-                if panorama_url:
-                    try:
-                        req = request.Request(panorama_url, headers={'User-Agent': 'Mozilla/5.0'})
-                        with request.urlopen(req) as response, open(target_path, 'wb') as out_file:
-                            data = response.read()
-                            out_file.write(data)
-                            out_file.flush()
-                            os.fsync(out_file.fileno())
-
-                        if os.path.exists(target_path) and os.path.getsize(target_path) > 0:
-                            app = omni.kit.app.get_app()
-                            context = omni.usd.get_context()
-                            stage = context.get_stage()
-                            print(f"\nGenerated HDR URL: {panorama_url}")
-                            app = omni.kit.app.get_app()
-
-                            if stage:
-                                stage_path = context.get_stage_url()
-                                context.open_stage(stage_path)
-
-                                for _ in range(30):
-                                    await app.next_update_async()
-
-                                self.switch_to_edify()
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + GENERATION_TIMEOUT
+                attempt = 0
+                while True:
+                    panorama_url = await self.check_generation_status(session, generation_id)
+
+                    if panorama_url:
+                        try:
+                            # Streamed to a temp file renamed over the HDR, in a session without the API credentials
+                            tmp_path = target_path + ".tmp"
+                            try:
+                                async with aiohttp.ClientSession(headers={"User-Agent": "Mozilla/5.0"}) as download:
+                                    async with download.get(panorama_url) as response:
+                                        response.raise_for_status()
+                                        with open(tmp_path, "wb") as out_file:
+                                            async for chunk in response.content.iter_chunked(65536):
+                                                out_file.write(chunk)
+                                os.replace(tmp_path, target_path)
+                            finally:
+                                # Failed or cancelled download, don't leave the partial file behind
+                                if os.path.exists(tmp_path):
+                                    os.remove(tmp_path)
+
+                            if os.path.exists(target_path) and os.path.getsize(target_path) > 0:
+                                context = omni.usd.get_context()
+                                stage = context.get_stage()
+                                print(f"\nGenerated HDR URL: {panorama_url}")
+
+                                if stage:
+                                    stage_path = context.get_stage_url()
+                                    # Returns once the stage is opened instead of waiting a fixed 30 frames
+                                    result, error = await context.open_stage_async(stage_path)
+                                    if not result:
+                                        carb.log_error(f"Error reopening {stage_path}: {error}")
+                                        return
+
+                                    self.switch_to_edify()
+                                return
+                        except Exception as e:
+                            carb.log_error(f"Error downloading the Edify HDR {panorama_url}: {e}")
                             return
-                    except Exception as e:
+
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        carb.log_warn(f"The Edify generation did not complete in {GENERATION_TIMEOUT} seconds")
                         return
 
-                await asyncio.sleep(RETRY_DELAY)
+                    # Backoff from 1 second so a short generation is picked up quickly, up to RETRY_DELAY between
+                    # the polls of a long one
+                    delay = min(2**attempt, RETRY_DELAY, remaining)
+                    attempt += 1
+                    print(f"Still generating... waiting {delay:.1f} seconds")
+                    await asyncio.sleep(delay)
 
         except Exception as e:
+            carb.log_error(f"Error calling the Shutterstock API: {e}")
             return
 
+    def _subscribe_combo(self, combo: ComboBox, fn):
+        self._combo_subscriptions.append((combo.model, combo.model.add_item_changed_fn(fn)))
+
     def _build_fn(self):
-        params = self._uplift_model.get_parameters_spec()
+        # The combo boxes of the previous build are destroyed with it
+        self._combo_subscriptions.clear()
         title = "Espresso Machine Configuration"
         with ui.VStack(height=0, spacing=3):
 
@@ -383,25 +448,27 @@ class UpliftParameterWidget:
             with ui.HStack(height=25, separate_window=True, content_clipping=True):
                 """Build the Display Type Label"""
                 with ui.VStack(height=0, spacing=3):
-                    with ui.HStack(width=0):
-                        Label("Display types")
-                        Separator()
-                        Info(tooltip_heading="Text search", tooltip="This sets the USD Variant Set for different control types on the espresso machine.")
+                    _param_header(
+                        "Display types",
+                        "This sets the USD Variant Set for different control types on the espresso machine.",
+                        tooltip_heading="Text search",
+                    )
                     combo = ComboBox(
                         1,
                         "Analog",
                         "Touch Screen",
                         arrow_only=False,
                     )
-                    combo.model.add_item_changed_fn(self.change_display)
+                    self._subscribe_combo(combo, self.change_display)
 
                 Separator()
                 """Build the Cup Type Label"""
                 with ui.VStack(height=0, spacing=3):
-                    with ui.HStack(width=0):
-                        Label("Cup type")
-                        Separator()
-                        Info(tooltip_heading="Text search", tooltip="This sets the USD Variant Set for different type of mugs that are set on the espresso machine.")
+                    _param_header(
+                        "Cup type",
+                        "This sets the USD Variant Set for different type of mugs that are set on the espresso machine.",
+                        tooltip_heading="Text search",
+                    )
                     combo = ComboBox(
                         0,
                         "Glass Mug",
@@ -409,16 +476,17 @@ class UpliftParameterWidget:
                         "Coffee Mug",
                         arrow_only=False,
                     )
-                    combo.model.add_item_changed_fn(self.change_cup)
+                    self._subscribe_combo(combo, self.change_cup)
 
             Separator()
             """Build the Machine Color Label"""
             with ui.HStack(height=25, separate_window=True, content_clipping=True):
                 with ui.VStack(height=0, spacing=3):
-                    with ui.HStack(width=0):
-                        Label("Machine color")
-                        Separator()
-                        Info(tooltip_heading="Text search", tooltip="This sets the USD Variant Set for different colors on the espresso machine.")
+                    _param_header(
+                        "Machine color",
+                        "This sets the USD Variant Set for different colors on the espresso machine.",
+                        tooltip_heading="Text search",
+                    )
                     combo = ComboBox(
                         0,
                         "Black",
@@ -427,15 +495,16 @@ class UpliftParameterWidget:
                         "Olive",
                         arrow_only=False,
                     )
-                    combo.model.add_item_changed_fn(self.change_machine)
+                    self._subscribe_combo(combo, self.change_machine)
 
                 Separator()
                 """Build the Environment HDRI Label"""
                 with ui.VStack(height=0, spacing=3):
-                    with ui.HStack(width=0):
-                        Label("Environment HDRI")
-                        Separator()
-                        Info(tooltip_heading="Text search", tooltip="This sets the USD Variant Set for different HDR images used beyond the window of the scene. These were generated using Edify360.")
+                    _param_header(
+                        "Environment HDRI",
+                        "This sets the USD Variant Set for different HDR images used beyond the window of the scene. These were generated using Edify360.",
+                        tooltip_heading="Text search",
+                    )
 
                 # COMMENT OUT THIS SECTION
                     """Build the Dropdown for Environment HDRI"""
@@ -447,7 +516,7 @@ class UpliftParameterWidget:
                         "None",
                         arrow_only=False,
                     )
-                    combo.model.add_item_changed_fn(self.change_env)
+                    self._subscribe_combo(combo, self.change_env)
                 # END OF COMMENT OUT SECTION
 
 
@@ -459,7 +528,7 @@ class UpliftParameterWidget:
                     #     self._run_button = ui.Button(
                     #         "Run",
                     #         width=90,
-                    #         clicked_fn=lambda: asyncio.ensure_future(self.run_async_handler()),
+                    #         clicked_fn=self._on_run_clicked,
                     #         style={"Button": {"border_radius": 20},"background_color": 0x7600FFb9 }
                     #     )
                 # END OF UNCOMMENT OUT SECTION
@@ -469,77 +538,91 @@ class UpliftParameterWidget:
             Separator()
             Label("Composition Prompts", name="sceneTitle")
             Separator()
-            for param in params:
-                self._build_param(param)
+            self._params_stack = ui.VStack(height=0, spacing=3)
+            self._rebuild_params()
+
+    def _rebuild_params(self):
+        """Build the frames of all the parameters"""
+        self._params_stack.clear()
+        self._param_frames = {}
+        with self._params_stack:
+            for param in self._params:
+                self._add_param_frame(param)
+
+    def _add_param_frame(self, param):
+        name = param["name"]
+        self._param_frames[name] = ui.Frame(height=0, build_fn=functools.partial(self._build_param_frame, name))
+
+    def _build_param_frame(self, name: str):
+        with ui.VStack(height=0, spacing=3):
+            self._build_param(self._params_by_name[name])
 
-                Separator()
+            Separator()
+
+    def _on_value_changed(self, name: str, value_type: str, value_attr: str, value_model):
+        """Set the parameter from its widget model, value_attr is the model property that gives the value"""
+        self._uplift_model.set_parameters(name, value_type, getattr(value_model, value_attr))
+
+    def _param_model(self, param, model_type, value_attr: str):
+        """The value model of the parameter, created with its default value the first time it is built"""
+        name = param["name"]
+        if name in self._param_models:
+            return self._param_models[name][2]
+
+        param_model = model_type(param["default_value"])
+        callback = functools.partial(self._on_value_changed, name, param["type"], value_attr)
+        param_model.add_value_changed_fn(callback)
+        self._param_models[name] = (param["type"], param["default_value"], param_model, callback)
+        return param_model
 
     def _build_float_param(self, param):
-        param_model = ui.SimpleFloatModel(param["default_value"])
-        param_model.add_value_changed_fn(
-            lambda value, name=param["name"]: self._uplift_model.set_parameters(name, "float", value.as_float)
-        )
+        param_model = self._param_model(param, ui.SimpleFloatModel, "as_float")
         ui.FloatSlider(model=param_model)
 
     def _build_int_param(self, param):
-        param_model = ui.SimpleIntModel(param["default_value"])
-        param_model.add_value_changed_fn(
-            lambda value, name=param["name"]: self._uplift_model.set_parameters(name, "int", value.as_int)
-        )
+        param_model = self._param_model(param, ui.SimpleIntModel, "as_int")
         ui.IntSlider(model=param_model)
 
     def _build_string_param(self, param):
-        param_model = ui.SimpleStringModel(param["default_value"])
-        param_model.add_value_changed_fn(
-            lambda value, name=param["name"]: self._uplift_model.set_parameters(name, "string", value.as_string)
-        )
+        param_model = self._param_model(param, ui.SimpleStringModel, "as_string")
         ExpandablePrompt(param_model)
 
     def _build_image_path_param(self, param):
-        param_model = ui.SimpleStringModel(param["default_value"])
-        param_model.add_value_changed_fn(
-            lambda value, name=param["name"]: self._uplift_model.set_parameters(name, "image_path", value.as_string)
-        )
+        param_model = self._param_model(param, ui.SimpleStringModel, "as_string")
         ExpandablePrompt(param_model)
 
+    # Builder of the value widget per parameter type
+    _BUILDERS = {
+        "float": _build_float_param,
+        "int": _build_int_param,
+        "string": _build_string_param,
+        "image_path": _build_image_path_param,
+    }
 
-# Build the parameter UI
+    # Build the parameter UI
     def _build_param(self, param):
+        builder = self._BUILDERS.get(param["type"])
+        if builder is None:
+            return
+
         with ui.VStack(height=0):
+            # The prompts show their description, the other types their default value
+            tooltip = param["description"] if param["type"] == "string" else param["default_value"]
+            _param_header(param["control_name"], tooltip, alignment=ui.Alignment.TOP)
+            builder(self, param)
 
-            if param["type"] == "float":
-                with ui.HStack(width=0):
-                    Label(param["control_name"], alignment=ui.Alignment.TOP)
-                    Separator()
-                    Info(tooltip_heading="Heading", tooltip=param["default_value"])
-                self._build_float_param(param)
-            elif param["type"] == "int":
-                with ui.HStack(width=0):
-                    Label(param["control_name"], alignment=ui.Alignment.TOP)
-                    Separator()
-                    Info(tooltip_heading="Heading", tooltip=param["default_value"])
-                self._build_int_param(param)
-            elif param["type"] == "string":
-                with ui.HStack(width=0):
-                    Label(param["control_name"], alignment=ui.Alignment.TOP)
-                    Separator()
-                    Info(tooltip_heading="Heading", tooltip=param["description"])
-                self._build_string_param(param)
-            elif param["type"] == "image_path":
-                with ui.HStack(width=0):
-                    Label(param["control_name"], alignment=ui.Alignment.TOP)
-                    Separator()
-                    Info(tooltip_heading="Heading", tooltip=param["default_value"])
-                self._build_image_path_param(param)
-            elif param["type"] == "float":
-                with ui.HStack(width=0):
-                    Label(param["control_name"], alignment=ui.Alignment.TOP)
-                    Separator()
-                    Info(tooltip_heading="Heading", tooltip=param["default_value"])
-                self._build_float_param(param)
+    def _on_run_clicked(self):
+        """Start the Shutterstock request, tracked so destroy() cancels it"""
+        task = asyncio.ensure_future(self.run_async_handler())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
     async def run_async_handler(self):
         """Handle async operations and keep track of tasks."""
+        if self._in_flight:
+            return
+        self._in_flight = True
+
         try:
             # Disable button and change text
             self._run_button.enabled = False
@@ -549,9 +632,12 @@ class UpliftParameterWidget:
             await self.call_shutterstock_api(self._string_model.get_value_as_string())
 
         finally:
-            # Restore button state
-            self._run_button.enabled = True
-            self._run_button.text = "Run"
+            self._in_flight = False
+
+            # Restore button state, unless the widget was destroyed
+            if self._run_button:
+                self._run_button.enabled = True
+                self._run_button.text = "Run"
 
             # Cleanup
             #self._string_model = None
@@ -28,23 +28,67 @@ from omni.kit.mainwindow import get_main_window
 from omni.kit.quicklayout import QuickLayout
 from omni.kit.viewport.utility import get_viewport_from_window_name
 from PIL import Image
-from typing import Dict, List
+from typing import Dict, List, Union
 import omni.kit.livestream.messaging as messaging
 from .viewport_suppress import ViewportSuppress
 import csv
 import os
 import numpy as np
+from pybase64 import b64encode
 
 COMMAND_MACRO_SETTING = "/exts/omni.kit.command_macro.core/"
 COMMAND_MACRO_FILE_SETTING = COMMAND_MACRO_SETTING + "macro_file"
 
 # Maximum message size in bytes
 MAX_MESSAGE_SIZE = 32768
+# Size of the parts of the images sent to the web frontend, see _send_image
+MAX_MESSAGE_SIZE_SETTING = "/exts/omni.conditioning_for_precise_visual_generative_ai.setup/max_message_size"
+
+# Images of a batch that can wait for their PNG to be written
+MAX_PENDING_SAVES = 2
+# Rows of a CSV batch read ahead of the generation
+CSV_QUEUE_SIZE = 4
+# Variant of the values of the CSV columns, the other values get the variant of the last choice
+CSV_DISPLAY_VARIANTS = {"Touch Screen": "Display1", "Analog": "Display2"}
+CSV_CUP_VARIANTS = {"Glass Mug": "Glass_Mug", "Espresso Cup": "Espresso_Cup", "Coffee Mug": "Coffee_Mug"}
+CSV_BACKDROP_VARIANTS = {"Lighting 1": "Lake_view", "Lighting 2": "Lookout"}
+
+# Size of an image message without its data, its event type and its name, with the largest values of the other
+# fields. The lengths of the type and the name are added per image
+_METADATA_SIZE = len(
+    json.dumps(
+        {
+            "event_type": "",
+            "payload": {
+                "width": 99999,
+                "height": 99999,
+                "part": 999,
+                "total_parts": 999,
+                "data": "",
+                "encoding": "base64",
+                "name": "",
+                "status": "success",
+            },
+        },
+        indent=2,
+    )
+)
 
 # Global variable to store the SetupExtension instance
 setup_extension_instance = None
 
 
+@functools.lru_cache(maxsize=None)
+def _event_type(name: str) -> int:
+    """The carb event type of the name, the names are a handful of constants so they are all kept"""
+    return carb.events.type_from_string(name)
+
+
+def _pixels_to_bytes(pixels: list) -> bytes:
+    """The raw bytes of a list of pixel tuples or of channel values, converted in C by numpy"""
+    return np.asarray(pixels, dtype=np.uint8).tobytes()
+
+
 @functools.lru_cache()
 def get_extension_path():
     return pathlib.Path(omni.kit.app.get_app().get_extension_manager().get_extension_path_by_module(__name__))
@@ -79,6 +123,11 @@ class SetupExtension(omni.ext.IExt):
         import carb.settings
 
         self._settings = carb.settings.get_settings()
+        # Sender of the variant events pushed by the extension
+        self._sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
+        self._bus = omni.kit.app.get_app().get_message_bus_event_stream()
+        # Event types already registered to be sent to the web frontend
+        self._registered_event_types = set()
 
         # get auto load stage name
         # stage_url = self._settings.get_as_string("/app/auto_load_usd")
@@ -108,9 +157,11 @@ class SetupExtension(omni.ext.IExt):
         self._uplift_model = viewport_core_instance._uplift_model
         self._setup_viewport_buffers()
 
-        new_event_type = carb.events.type_from_string("queryComfyUI")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        self._event = bus.create_subscription_to_pop_by_type(new_event_type, self._on_generate)
+        # Reused by every generation, its overlay is only built once
+        self._suppress = ViewportSuppress()
+
+        new_event_type = _event_type("queryComfyUI")
+        self._event = self._bus.create_subscription_to_pop_by_type(new_event_type, self._on_generate)
 
         #self._on_generate(None)
 
@@ -161,20 +212,16 @@ class SetupExtension(omni.ext.IExt):
 
         # Set variant to enable caching
         new_payload = {"variant": "Display1"}
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setDisplayVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload=new_payload)
+        new_event_type = _event_type("setDisplayVariant")
+        self._bus.push(new_event_type, sender=self._sender_id, payload=new_payload)
 
         app = omni.kit.app.get_app()
         for _ in range(5):
             await app.next_update_async()
 
         new_payload = {"variant": "Display2"}
-        _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-        new_event_type = carb.events.type_from_string("setDisplayVariant")
-        bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        bus.push(new_event_type, sender=_sender_id, payload=new_payload)
+        new_event_type = _event_type("setDisplayVariant")
+        self._bus.push(new_event_type, sender=self._sender_id, payload=new_payload)
 
         app = omni.kit.app.get_app()
         for _ in range(5):
@@ -183,23 +230,18 @@ class SetupExtension(omni.ext.IExt):
 
     def _setup_viewport_buffers(self):
         """Set the viewport buffer with all the required buffer"""
-        required_buffer = []
-        required_capture_types = []
-        params = self._uplift_model.get_parameters_spec()
-        for param in params:
-            if param["type"] == "image":
-                buffer_name = param["buffer_name"]
-                if buffer_name in self._viewport_buffers_capture.supported_buffer_types:
-                    control_name = param["control_name"]
-                    asset_path = param["asset_path"]
-                    if "visibility" in param:
-                        visibility = param["visibility"]
-                    else:
-                        visibility = "showall"
-                    required_buffer.append(buffer_name)
-                    required_capture_types.append([buffer_name, control_name, asset_path, visibility])
-                else:
-                    carb.log_error(f"'{buffer_name} is not supported")
+        supported = set(self._viewport_buffers_capture.supported_buffer_types)
+        image_params = [param for param in self._uplift_model.get_parameters_spec() if param["type"] == "image"]
+        for param in image_params:
+            if param["buffer_name"] not in supported:
+                carb.log_error(f"'{param['buffer_name']} is not supported")
+
+        required_capture_types = [
+            [param["buffer_name"], param["control_name"], param["asset_path"], param.get("visibility", "showall")]
+            for param in image_params
+            if param["buffer_name"] in supported
+        ]
+        required_buffer = [capture_type[0] for capture_type in required_capture_types]
 
         self._viewport_buffers_capture.set_active_buffer_types(required_buffer)
         self._viewport_buffers_capture.set_active_capture_types(required_capture_types)
@@ -226,8 +268,7 @@ class SetupExtension(omni.ext.IExt):
                 self._uplift_model.set_parameters(prompt_name, "string", prompt_data)
 
         async def _generate_async():
-            suppress = ViewportSuppress()
-            await suppress.begin()
+            await self._suppress.begin()
 
             # Update the model with the current viewport buffers
             await self._viewport_buffers_capture.capture_viewport_async()
@@ -235,22 +276,26 @@ class SetupExtension(omni.ext.IExt):
             # Then we update the model
             self._uplift_model.update_viewport_buffers(self._viewport_buffers_capture.get_viewport_buffers())
 
-            await suppress.end()
-            suppress = None
+            await self._suppress.end()
 
             # The prompt is ready to schedule the inference update
             uplifted_image, size = await self._uplift_model.generate()
+            if uplifted_image is None:
+                # Already logged by the model
+                return
 
             # update the viewport with the new image
             # self._uplift_canvas.update_image(uplifted_image, size)
             # self._ext._output_window._uplift_canvas.update_image(uplifted_image, size)
 
-            self._send_image(size[0], size[1], uplifted_image)
+            # Decode, resize and encode in a thread, only the dispatch needs the loop
+            chunks = await asyncio.to_thread(self._prepare_chunks, size[0], size[1], uplifted_image)
+            self._dispatch_chunks(chunks)
 
         # Start the async task to generate the prompt
         asyncio.ensure_future(_generate_async())
 
-    def _on_generate_batch(self, parameters: List[Dict[str, str]]):
+    def _on_generate_batch(self, parameters: Union[List[Dict[str, str]], asyncio.Queue]):
         """
         Generate a batch of images based on the provided parameters.
 
@@ -259,8 +304,9 @@ class SetupExtension(omni.ext.IExt):
         generating the image, and saving it to disk.
 
         Args:
-            parameters (List[Dict[str, str]]): A list of dictionaries, where each dictionary
-                contains parameters for a single image generation task.
+            parameters (List[Dict[str, str]] or asyncio.Queue): A list of dictionaries, where each dictionary
+                contains parameters for a single image generation task. Or a queue the dictionaries are put in as
+                they are read, terminated by None, so the generation starts with the first one.
 
         Each parameter dictionary may include the following keys:
         - Variant keys: "setDisplayVariant", "setCupVariant", "setColorVariant", "setBackdropVariant"
@@ -290,19 +336,34 @@ class SetupExtension(omni.ext.IExt):
         async def _set_variant(variant_name: str, variant_value: str):
             """Set a specific variant in the scene."""
             new_payload = {"variant": variant_value}
-            _sender_id = carb.events.acquire_events_interface().acquire_unique_sender_id()
-            new_event_type = carb.events.type_from_string(variant_name)
-            bus = omni.kit.app.get_app().get_message_bus_event_stream()
-            bus.push(new_event_type, sender=_sender_id, payload=new_payload)
-
-        async def _generate_single_async(params: Dict[str, str]):
-            """Generate a single image based on the provided parameters and save associated JSON."""
-            # Save JSON file with original, unchanged input parameters
+            new_event_type = _event_type(variant_name)
+            self._bus.push(new_event_type, sender=self._sender_id, payload=new_payload)
+
+        def _save_outputs(json_path: Path, json_text: str, output_filename: str, size, image_bytes: bytes):
+            """Write the parameters and encode and write the PNG, runs in a thread while the next image is generated."""
+            try:
+                json_path.write_text(json_text)
+                carb.log_info(f"Saved input parameters to: {json_path}")
+            except Exception as e:
+                carb.log_error(f"Error saving {json_path}: {e}")
+
+            try:
+                img = Image.frombytes("RGBA", size, image_bytes)
+                img.save(output_filename, "PNG")
+                carb.log_info(f"Saved generated image to: {output_filename}")
+            except Exception as e:
+                carb.log_error(f"Error saving {output_filename}: {e}")
+
+        async def _generate_single_async(params: Dict[str, str]) -> asyncio.Future:
+            """
+            Generate a single image based on the provided parameters and save associated JSON. Return the task that
+            saves them.
+            """
+            # JSON of the original, unchanged input parameters, serialized now as params is changed below and written
+            # with the image
             output_filename = params["_output"]
-            json_filename = os.path.splitext(output_filename)[0] + ".json"
-            with open(json_filename, 'w') as json_file:
-                json.dump(params, json_file, indent=2)
-            carb.log_info(f"Saved input parameters to: {json_filename}")
+            json_path = Path(output_filename).with_suffix(".json")
+            json_text = json.dumps(params, indent=2)
 
             # Set variants
             variant_keys = ["setDisplayVariant", "setCupVariant", "setColorVariant", "setBackdropVariant"]
@@ -325,24 +386,46 @@ class SetupExtension(omni.ext.IExt):
 
             # Generate image
             uplifted_image, size = await self._uplift_model.generate()
+            if uplifted_image is None:
+                raise RuntimeError("the generation failed")
 
             # Convert image data to bytes if it's a list
             if isinstance(uplifted_image, list):
-                uplifted_image = np.array(uplifted_image, dtype=np.uint8).tobytes()
+                uplifted_image = _pixels_to_bytes(uplifted_image)
 
-            # Save image to disk
-            img = Image.frombytes("RGBA", size, uplifted_image)
-            img.save(output_filename, "PNG")
-            carb.log_info(f"Saved generated image to: {output_filename}")
+            # Save the JSON and the image to disk off the loop
+            return asyncio.ensure_future(
+                asyncio.to_thread(_save_outputs, json_path, json_text, output_filename, size, uplifted_image)
+            )
 
-        async def _generate_batch_async(params_list: List[Dict[str, str]]):
+        async def _generate_batch_async(params_queue: asyncio.Queue):
             """Process the entire batch of image generation tasks."""
-            for i, params in enumerate(params_list):
+            # The PNG of an image is saved while the next one is generated
+            saves = set()
+            i = 0
+            while (params := await params_queue.get()) is not None:
+                i += 1
                 try:
-                    carb.log_info(f"Generating image {i+1}/{len(params_list)}")
-                    await _generate_single_async(params)
+                    carb.log_info(f"Generating image {i} ({params_queue.qsize()} queued)")
+                    save = await _generate_single_async(params)
+                    saves.add(save)
+                    save.add_done_callback(saves.discard)
                 except Exception as e:
-                    carb.log_error(f"Error generating batch item {i}: {e}")
+                    carb.log_error(f"Error generating batch item {i - 1}: {e}")
+
+                # Bounded so the images waiting for their PNG don't pile up in memory
+                if len(saves) >= MAX_PENDING_SAVES:
+                    await asyncio.wait(saves, return_when=asyncio.FIRST_COMPLETED)
+
+            if saves:
+                await asyncio.wait(saves)
+
+        if not isinstance(parameters, asyncio.Queue):
+            params_queue = asyncio.Queue()
+            for params in parameters:
+                params_queue.put_nowait(params)
+            params_queue.put_nowait(None)
+            parameters = params_queue
 
         # Start the async task to generate the batch
         asyncio.ensure_future(_generate_batch_async(parameters))
@@ -357,11 +440,18 @@ class SetupExtension(omni.ext.IExt):
         with Image.open(image_path) as img:
             width, height = img.size
             img_data = img.tobytes()
-            self._send_image(width, height, img_data)
+            self._send_image(width, height, img_data, channels=len(img.getbands()))
 
-    @staticmethod
     def _send_image(
-        width, height, data, event_type="ImageTransferEvent", event_name=None, max_size=None, max_message_size=65535
+        self,
+        width,
+        height,
+        data,
+        event_type="ImageTransferEvent",
+        event_name=None,
+        max_size=None,
+        max_message_size=None,
+        channels=4,
     ):
         """
         Send an image to the web frontend by splitting it into chunks and dispatching events.
@@ -373,7 +463,9 @@ class SetupExtension(omni.ext.IExt):
             event_type (str, optional): The type of event to dispatch. Defaults to "ImageTransferEvent".
             event_name (str, optional): An optional name for the event. Defaults to None.
             max_size (int, optional): Maximum size (in pixels) for the image's width or height. If specified, the image will be resized while maintaining aspect ratio. Defaults to None.
-            max_message_size (int, optional): Maximum size (in bytes) for each message chunk. Defaults to 65535.
+            max_message_size (int, optional): Maximum size (in bytes) for each message chunk. Defaults to the
+                max_message_size setting of the extension, or 65535.
+            channels (int, optional): 3 for RGB or 4 for RGBA bytes or tuples, unused for a PIL Image. Defaults to 4.
 
         Raises:
             ValueError: If the data format is invalid or cannot be processed.
@@ -382,12 +474,28 @@ class SetupExtension(omni.ext.IExt):
             This method splits the image data into chunks and sends them as separate events to accommodate message size limitations.
             The image is converted to RGBA format before sending.
         """
-        # Register custom event type
-        messaging.register_event_type_to_send(event_type)
+        self._dispatch_chunks(
+            self._prepare_chunks(width, height, data, event_type, event_name, max_size, max_message_size, channels)
+        )
 
-        message_bus = omni.kit.app.get_app().get_message_bus_event_stream()
-        event_type = carb.events.type_from_string(event_type)
+    @staticmethod
+    def _prepare_chunks(
+        width,
+        height,
+        data,
+        event_type="ImageTransferEvent",
+        event_name=None,
+        max_size=None,
+        max_message_size=None,
+        channels=4,
+    ):
+        """
+        Convert the image to the event type, the payload and the base64 parts of the messages of _send_image, or None
+        when the data can't be read. Doesn't touch the message bus so it can run in a thread.
+        """
         event_status = "success"
+        # Every part is a dispatch and a JSON serialization, larger parts are opt-in through the setting
+        max_message_size = max_message_size or carb.settings.get_settings().get(MAX_MESSAGE_SIZE_SETTING) or 65535
 
         # Check if data is a PIL Image
         if isinstance(data, Image.Image):
@@ -397,38 +505,33 @@ class SetupExtension(omni.ext.IExt):
 
             # Convert list of tuples to bytes if necessary
             if isinstance(data, list):
-                data = b"".join(bytes(pixel) for pixel in data)
+                data = _pixels_to_bytes(data)
             elif not isinstance(data, bytes):
                 raise ValueError("data must be either bytes, a list of RGB/RGBA tuples, or a PIL Image")
 
-            # Determine if the image is RGB or RGBA
-            channels = 3 if len(data) == width * height * 3 else 4
-            mode = "RGB" if channels == 3 else "RGBA"
+            mode = "RGBA" if channels == 4 else "RGB"
 
             # Create an image from the data
             try:
                 img = Image.frombytes(mode, (width, height), data)
             except ValueError as e:
-                print(f"Error creating image: {e}")
-                print(f"Expected data length: {width * height * channels}, Actual data length: {len(data)}")
-                return
+                carb.log_error(
+                    f"Error creating image: {e}. "
+                    f"Expected data length: {width * height * channels}, Actual data length: {len(data)}"
+                )
+                return None
 
-        if not img.getbbox():
-            event_status = "error"
+        # Whether the empty check looks at the alpha or at the colors, see below
+        has_alpha = "A" in img.getbands()
 
-        print(
+        carb.log_verbose(
             f"[Send Image] Received image data: width={width}, height={height}, "
             f"data type={type(data)}, "
             f"data length={len(data) if isinstance(data, (list, bytes)) else 'N/A'} "
             f"type={event_type} "
-            f"name={event_name} "
-            f"event_status={event_status}"
+            f"name={event_name}"
         )
 
-        # Convert to RGBA if it's not already
-        if img.mode != "RGBA":
-            img = img.convert("RGBA")
-
         # Resize the image if max_size is set
         if max_size:
             # Calculate the scaling factor
@@ -436,71 +539,96 @@ class SetupExtension(omni.ext.IExt):
             if scale < 1:
                 new_width = int(img.width * scale)
                 new_height = int(img.height * scale)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-                print(f"[Send Image] Resized image to: {new_width}x{new_height}")
+                # Only a preview for the frontend, bilinear after a box reduction like thumbnail() is much cheaper than
+                # LANCZOS and looks the same at this size
+                img = img.resize((new_width, new_height), Image.BILINEAR, reducing_gap=2.0)
+                carb.log_verbose(f"[Send Image] Resized image to: {new_width}x{new_height}")
+
+        # RGBA is sent, converted after the resize so the other modes resize less data
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
 
         # Convert the image to raw RGBA bytes
         img_bytes = img.tobytes()
 
-        print(f"[Send Image] Sending image data: width={img.width}, height={img.height}, data length={len(img_bytes)}")
+        # Same as getbbox() on the bytes that are sent anyway instead of another pass over the image, an image is empty
+        # when it is fully transparent, or black when it has no alpha
+        pixels = np.frombuffer(img_bytes, dtype=np.uint8)
+        if not (pixels[3::4] if has_alpha else pixels.reshape(-1, 4)[:, :3]).any():
+            event_status = "error"
 
-        # Estimate metadata size
-        metadata_size = len(
-            json.dumps(
-                {
-                    "event_type": event_type,
-                    "payload": {
-                        "width": img.width,
-                        "height": img.height,
-                        "part": 999,
-                        "total_parts": 999,
-                        "data": "",
-                        "name": event_name,
-                        "status": event_status,
-                    },
-                },
-                indent=2,
-            )
+        carb.log_verbose(
+            f"[Send Image] Sending image data: width={img.width}, height={img.height}, data length={len(img_bytes)} "
+            f"event_status={event_status}"
         )
 
-        # Calculate the maximum data size per chunk
-        max_data_size = (max_message_size - metadata_size) // 2
+        # Estimate metadata size
+        metadata_size = _METADATA_SIZE + len(event_type) + len(event_name or "")
+
+        # Calculate the maximum data size per chunk, base64 is 4 chars per 3 bytes so keep it a multiple of 3 to
+        # not pad the chunks
+        max_data_size = (max_message_size - metadata_size) * 3 // 4 // 3 * 3
 
         # Calculate the number of parts
         total_parts = -(-len(img_bytes) // max_data_size)  # Ceiling division
 
-        for part in range(total_parts):
-            start = part * max_data_size
-            end = min((part + 1) * max_data_size, len(img_bytes))
-            chunk = img_bytes[start:end]
-
-            # Encode the chunk as a hex string
-            encoded_chunk = chunk.hex()
+        payload = {
+            "width": img.width,
+            "height": img.height,
+            "part": 0,
+            "total_parts": total_parts,
+            "encoding": "base64",
+            "status": event_status,
+        }
+        if event_name:
+            payload["name"] = event_name
+
+        # Slice without copying, the chunks are only read by the encoder. Encoded as base64, a third smaller than hex
+        img_view = memoryview(img_bytes)
+        parts = [
+            b64encode(img_view[start : start + max_data_size]).decode("ascii")
+            for start in range(0, len(img_bytes), max_data_size)
+        ]
+
+        return event_type, payload, parts
+
+    def _dispatch_chunks(self, chunks):
+        """Send the parts made by _prepare_chunks to the web frontend"""
+        if chunks is None:
+            return
 
-            # Prepare the payload
-            payload = {
-                "width": img.width,
-                "height": img.height,
-                "part": part,
-                "total_parts": total_parts,
-                "status": event_status,
-            }
+        event_type, payload, parts = chunks
 
-            if event_name:
-                payload["name"] = event_name
+        self._register_event_type(event_type)
 
-            payload["data"] = encoded_chunk
+        # The parts carry no image id, they are all dispatched without yielding so the parts of another image can't
+        # be interleaved with them
+        event_type = _event_type(event_type)
+        # dispatch copies the payload into a carb dictionary, so the same dict is reused for every part
+        for part, data in enumerate(parts):
+            payload["part"] = part
+            payload["data"] = data
 
             # Dispatch the event
-            message_bus.dispatch(event_type, payload=payload)
+            self._bus.dispatch(event_type, payload=payload)
+
+        carb.log_verbose(f"[Send Image] Sent image in {len(parts)} parts")
 
-        print(f"[Send Image] Sent image in {total_parts} parts")
+    def _register_event_type(self, event_type: str):
+        """Register the custom event type to be sent to the web frontend, once per type"""
+        if event_type not in self._registered_event_types:
+            messaging.register_event_type_to_send(event_type)
+            self._registered_event_types.add(event_type)
 
     def on_shutdown(self):
         """This is called every time the extension is deactivated."""
         global setup_extension_instance
         setup_extension_instance = None
 
+        if self._suppress:
+            self._suppress.destroy()
+            self._suppress = None
+
     def _generate_csv(self, csv_file_path: str):
         """
         Generate batch images based on parameters specified in a CSV file.
@@ -526,8 +654,16 @@ class SetupExtension(omni.ext.IExt):
 
         The function will process each row and generate an image using the specified parameters.
         """
-        parameters = []
+        # The rows are generated as they are read, the queue is bounded so the file is read as the batch progresses
+        params_queue = asyncio.Queue(maxsize=CSV_QUEUE_SIZE)
+        self._on_generate_batch(params_queue)
+        asyncio.ensure_future(self._read_csv_async(csv_file_path, params_queue))
+
+    async def _read_csv_async(self, csv_file_path: str, params_queue: asyncio.Queue):
+        """Put the parameters of every row of the CSV file in the queue of the batch, then None"""
+        count = 0
         output_folder = os.path.dirname(csv_file_path)
+        carb.log_info(f"Output images will be saved in: {output_folder}")
 
         try:
             with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
@@ -538,12 +674,10 @@ class SetupExtension(omni.ext.IExt):
                     output_path = os.path.join(output_folder, output_filename)
 
                     param = {
-                        "setDisplayVariant": "Display1" if row["Display Type"] == "Touch Screen" else "Display2",
+                        "setDisplayVariant": CSV_DISPLAY_VARIANTS.get(row["Display Type"], "Display2"),
                         "setColorVariant": row["Machine Color"],
-                        "setCupVariant": "Glass_Mug" if row["Mug Type"] == "Glass Mug" else
-                                         "Espresso_Cup" if row["Mug Type"] == "Espresso Cup" else
-                                         "Coffee_Mug",
-                        "setBackdropVariant": "Lake_view" if row["HDRI"] == "Lighting 1" else "Lookout",
+                        "setCupVariant": CSV_CUP_VARIANTS.get(row["Mug Type"], "Coffee_Mug"),
+                        "setBackdropVariant": CSV_BACKDROP_VARIANTS.get(row["HDRI"], "Lookout"),
                         "globalPrompt": row["Global"],
                         "teaCupPrompt": row["Plate"],
                         "vasePrompt": row["Jar"],
@@ -551,11 +685,10 @@ class SetupExtension(omni.ext.IExt):
                         "cabinetsPrompt": row["Kitchen"],
                         "_output": output_path
                     }
-                    parameters.append(param)
+                    await params_queue.put(param)
+                    count += 1
 
-            carb.log_info(f"Loaded {len(parameters)} image generation tasks from CSV.")
-            carb.log_info(f"Output images will be saved in: {output_folder}")
-            self._on_generate_batch(parameters)
+            carb.log_info(f"Loaded {count} image generation tasks from CSV.")
 
         except FileNotFoundError:
             carb.log_error(f"CSV file not found: {csv_file_path}")
@@ -563,6 +696,9 @@ class SetupExtension(omni.ext.IExt):
             carb.log_error(f"Error reading CSV file: {e}")
         except Exception as e:
             carb.log_error(f"Unexpected error processing CSV: {e}")
+        finally:
+            # The rows read before an error are still generated
+            await params_queue.put(None)
 
 
 # Global functions to call SetupExtension methods
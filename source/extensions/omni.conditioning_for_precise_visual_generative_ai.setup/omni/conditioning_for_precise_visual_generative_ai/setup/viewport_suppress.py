@@ -19,6 +19,9 @@ import omni.ui as ui
 class ViewportSuppress:
     """
     A class to suppress the viewport display.
+
+    The instance can be reused, the overlay widgets are built on the first begin() and only hidden by end() so the next
+    begin() only uploads the new capture.
     """
 
     def __init__(self, viewport_frame_name: str = "Viewport Frame Suppress"):
@@ -29,17 +32,36 @@ class ViewportSuppress:
             viewport_frame_name (str): Name of the viewport frame to suppress.
         """
         self._viewport_frame_name: str = viewport_frame_name
-        self._viewport_api, self._viewport_window = self._get_viewport()
+        self._viewport_api = None
+        self._viewport_window = None
+        self._frame: Optional[ui.Frame] = None
         self._byte_provider: Optional[ui.ByteImageProvider] = None
 
     def __del__(self):
         """Cleanup when the instance is deleted."""
-        self._end()
+        self.destroy()
+
+    def destroy(self) -> None:
+        """Remove the overlay from the viewport and release the captured image."""
+        if self._frame is not None:
+            self._frame.clear()
+            self._frame.visible = True
+        self._frame = None
+        self._viewport_api = None
+        self._viewport_window = None
+        self._byte_provider = None
 
     async def begin(self) -> None:
         """
         Begin viewport suppression by capturing and displaying a static image.
         """
+        viewport_api, viewport_window = self._get_viewport()
+        if viewport_window is not self._viewport_window:
+            # The active viewport changed, the overlay is built again in the new one
+            self.destroy()
+            self._viewport_window = viewport_window
+        self._viewport_api = viewport_api
+
         await self._viewport_api.schedule_capture(ByteCapture(self._on_capture_completed)).wait_for_result()
 
     async def end(self) -> None:
@@ -68,7 +90,14 @@ class ViewportSuppress:
             height (int): Height of the captured image.
             format: Format of the captured image.
         """
-        with self._viewport_window.get_frame(self._viewport_frame_name):
+        if self._byte_provider is not None:
+            self._byte_provider.set_raw_bytes_data(buffer, [width, height], format)
+            self._frame.visible = True
+            return
+
+        self._frame = self._viewport_window.get_frame(self._viewport_frame_name)
+        self._frame.visible = True
+        with self._frame:
             with ui.ZStack():
                 # Image on top of the viewport
                 self._byte_provider = ui.ByteImageProvider()
@@ -83,10 +112,7 @@ class ViewportSuppress:
 
     def _end(self) -> None:
         """
-        Internal method to end viewport suppression and clean up resources.
+        Internal method to end viewport suppression, the overlay is hidden and kept for the next begin().
         """
-        if self._viewport_window is not None:
-            self._viewport_window.get_frame(self._viewport_frame_name).clear()
-            self._viewport_api = None
-            self._viewport_window = None
-            self._byte_provider = None
+        if self._frame is not None:
+            self._frame.visible = False